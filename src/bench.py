@@ -0,0 +1,117 @@
+'''
+Benchmark suite for the Manager and Memory hot paths.
+Synthetic traces are generated for every combination of:
+	size: number of operations (10^3 to 10^7)
+	ram ratio: RAM pages over the pages of all processes
+	mix: hit (most accesses go to a small hot set of pages of each process)
+		or fault (accesses spread over all pages)
+Every trace starts creating its processes and then makes accesses and small allocations.
+Each run reports the total time and, separately, the time spent in create_process,
+access_memory, allocate_memory and in evictions (Manager.swap_out), with events
+ignored (see events.py). Results are saved as JSON, and a previous result file can be
+given to compare the speed of each run.
+
+Usage: python bench.py [--sizes N ...] [--ratios R ...] [--mixes hit fault] [-o results.json]
+	[--compare old.json]
+'''
+import argparse
+import json
+import platform
+import random
+import sys
+import time as tm
+from memory import Memory
+from manager import Manager
+from events import NullSink
+
+PAGE_SIZE = 64
+PROCESSES = 16
+PROCESS_PAGES = 64	# pages of each process when created
+ALLOC_RATE = 0.02	# fraction of operations that allocate memory
+HOT_PAGES = 0.1		# fraction of pages of a process that get the accesses in the hit mix
+HOT_RATE = 0.95		# fraction of accesses to the hot pages in the hit mix
+'''
+Yields the operations of a synthetic trace with n_ops operations.
+'''
+def synthetic_trace(n_ops, mix, seed=0):
+	rng = random.Random(seed)
+	size = PROCESS_PAGES*PAGE_SIZE
+	hot = max(1, int(PROCESS_PAGES*HOT_PAGES))*PAGE_SIZE
+	for i in range(PROCESSES):
+		yield 'C', 'p'+str(i), size
+	for i in range(n_ops-PROCESSES):
+		process = 'p'+str(rng.randrange(PROCESSES))
+		if rng.random() < ALLOC_RATE:
+			yield 'M', process, rng.randint(1, PAGE_SIZE)
+		elif mix == 'hit' and rng.random() < HOT_RATE:
+			yield 'A', process, rng.randrange(hot)
+		else:
+			yield 'A', process, rng.randrange(size)
+'''
+Runs one synthetic trace, returning its result.
+'''
+def run(n_ops, ratio, mix, policy='lru', seed=0):
+	pages = PROCESSES*PROCESS_PAGES
+	ram = Memory(PAGE_SIZE, max(PROCESS_PAGES, int(pages*ratio)))
+	disc = Memory(PAGE_SIZE, pages*2 + n_ops//PAGE_SIZE)	# room for evicted and allocated pages
+	mngr = Manager(ram, disc, policy, PAGE_SIZE, NullSink())
+	phases = {'create': [0, 0.0], 'access': [0, 0.0], 'allocate': [0, 0.0], 'eviction': [0, 0.0]}
+	swap_out = mngr.swap_out
+	def timed_swap_out(time, n=1):	# times evictions inside the other operations
+		t0 = tm.perf_counter()
+		moved = swap_out(time, n)
+		phase = phases['eviction']
+		phase[0] = phase[0] + moved
+		phase[1] = phase[1] + tm.perf_counter() - t0
+		return moved
+	mngr.swap_out = timed_swap_out
+	calls = {'C': (mngr.create_process, phases['create']), 'A': (mngr.access_memory, phases['access']),
+		'M': (mngr.allocate_memory, phases['allocate'])}
+	clock = tm.perf_counter
+	start = clock()
+	for time, (op, process, num) in enumerate(synthetic_trace(n_ops, mix, seed)):
+		fn, phase = calls[op]
+		t0 = clock()
+		fn(process, num, time)
+		phase[0] = phase[0] + 1
+		phase[1] = phase[1] + clock() - t0
+	total = clock() - start
+	return {'ops': n_ops, 'ram_ratio': ratio, 'mix': mix, 'policy': policy, 'seconds': total,
+		'ops_per_sec': n_ops/total if total else 0.0,
+		'phases': dict((k, {'count': c, 'seconds': s}) for k, (c, s) in phases.items())}
+'''
+Prints the speed of each run against the run with the same parameters in an old result file.
+'''
+def compare(results, old):
+	key = lambda r: (r['ops'], r['ram_ratio'], r['mix'], r['policy'])
+	previous = dict((key(r), r) for r in old['results'])
+	for r in results:
+		o = previous.get(key(r))
+		if o is not None and o['ops_per_sec']:
+			print('{} ops, ratio {}, {} mix, {}: {:.2f}x'.format(r['ops'], r['ram_ratio'], r['mix'],
+				r['policy'], r['ops_per_sec']/o['ops_per_sec']))
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Benchmark of the simulator with synthetic traces.')
+	parser.add_argument('--sizes', type=int, nargs='+', default=[10**3, 10**4, 10**5])
+	parser.add_argument('--ratios', type=float, nargs='+', default=[0.25, 0.5, 1.0])
+	parser.add_argument('--mixes', nargs='+', choices=['hit', 'fault'], default=['hit', 'fault'])
+	parser.add_argument('--policy', default='lru')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('-o', '--output', default='bench_results.json', help='result file')
+	parser.add_argument('--compare', metavar='OLD', help='result file of a previous version')
+	args = parser.parse_args()
+	results = []
+	for n_ops in args.sizes:
+		for ratio in args.ratios:
+			for mix in args.mixes:
+				r = run(n_ops, ratio, mix, args.policy, args.seed)
+				results.append(r)
+				print('{} ops, ratio {}, {} mix: {:.3f}s, {:.0f} ops/s'.format(n_ops, ratio, mix,
+					r['seconds'], r['ops_per_sec']))
+				sys.stdout.flush()
+	with open(args.output, 'w') as f:
+		json.dump({'python': platform.python_version(), 'results': results}, f, indent=1)
+	if args.compare:
+		with open(args.compare) as f:
+			compare(results, json.load(f))
@@ -0,0 +1,72 @@
+'''
+Throughput of the Manager called from many threads.
+Each thread creates its own process and then makes random accesses to it, allocating
+memory every ALLOC_EVERY accesses. The same run is timed in two modes:
+	global: every Manager call holds one shared lock (as the old Random mode did)
+	fine: the Manager is called directly, relying on its own locks (see manager.py)
+The RAM holds ram_ratio times the pages of all processes, so a ratio below 1 makes
+threads fault and swap pages while others hit.
+The result is the number of operations per second for each mode and number of threads.
+
+Usage: python bench_threads.py [--threads N ...] [--ops N] [--pages N] [--ram-ratio R]
+'''
+import argparse
+import random
+import threading
+import time as tm
+from memory import Memory
+from manager import Manager
+from events import NullSink
+
+PAGE_SIZE = 64
+ALLOC_EVERY = 100
+'''
+Runs the workload with a number of threads, returning operations per second.
+'''
+def run(threads, ops, pages, ram_ratio, mode, policy='lru'):
+	ram_pages = max(threads, int(threads*pages*ram_ratio))
+	ram = Memory(PAGE_SIZE, ram_pages)
+	disc = Memory(PAGE_SIZE, threads*pages*4)	# room for swapped and allocated pages
+	mngr = Manager(ram, disc, policy, PAGE_SIZE, NullSink())
+	lock = threading.Lock()
+	def call(fn, *args):
+		if mode == 'global':
+			with lock:
+				return fn(*args)
+		return fn(*args)
+	for t in range(threads):		# processes grow one page at a time, swapping when RAM is full
+		call(mngr.create_process, 't'+str(t), PAGE_SIZE, 0)
+		for i in range(pages-1):
+			call(mngr.allocate_memory, 't'+str(t), PAGE_SIZE, 0)
+	start = threading.Barrier(threads+1)
+	def worker(t):
+		name = 't'+str(t)
+		rng = random.Random(t)
+		p = mngr.process_list[name]
+		start.wait()
+		for i in range(1, ops+1):
+			call(mngr.access_memory, name, rng.randrange(p.size), i)
+			if i%ALLOC_EVERY == 0:
+				call(mngr.allocate_memory, name, rng.randint(1, PAGE_SIZE), i)
+	workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+	for w in workers:
+		w.start()
+	start.wait()
+	t0 = tm.perf_counter()
+	for w in workers:
+		w.join()
+	elapsed = tm.perf_counter() - t0
+	return threads*(ops + ops//ALLOC_EVERY)/elapsed
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Manager throughput with a global lock and with its own locks.')
+	parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+	parser.add_argument('--ops', type=int, default=20000, help='accesses per thread')
+	parser.add_argument('--pages', type=int, default=64, help='pages per process')
+	parser.add_argument('--ram-ratio', type=float, default=0.9, help='RAM pages over pages of all processes')
+	args = parser.parse_args()
+	print('threads,mode,ops_per_sec')
+	for threads in args.threads:
+		for mode in ('global', 'fine'):
+			rate = run(threads, args.ops, args.pages, args.ram_ratio, mode)
+			print('{},{},{:.0f}'.format(threads, mode, rate))
@@ -0,0 +1,122 @@
+'''
+Events reported by the Manager and the sinks that receive them.
+The Manager doesn't print anything by itself: each thing that happens is an event
+passed to the emit method of its sink. Events are named tuples, all starting with
+the time of execution and the process name:
+	ProcessCreated: a process was created with size bytes
+	MemoryAllocated: size bytes were allocated to a process, now with total bytes
+	NoSpace: an operation (C or M) couldn't get size bytes from RAM
+	AccessHit: a process accessed an address at a page in RAM (frame) at the first try
+	AccessAfterFault: a process accessed an address at a page (frame) brought back by a page fault
+	PageFault: a page fault happened, address is None for faults caused by allocation
+	FaultHandled: the page fault was dealt with (pages were moved)
+	Eviction: a page left RAM to the disc
+	SwapIn: a page came back from the disc to RAM
+	Segfault: a process tried to access an address outside its size, or a process that
+		doesn't exist (or has ended) was used (size 0, address None unless it was an access)
+	OutOfMemory: there was no space left for an operation
+	Prefetch: a page was brought from disc to RAM ahead of its access (frame)
+	PrefetchHit: a prefetched page was accessed
+	PrefetchWasted: a prefetched page left RAM before being accessed
+	MemoryFreed: size bytes were freed by a process, now with total bytes
+	ProcessTerminated: a process with size bytes ended, releasing all its pages
+	InvalidOperation: a trace operation (op) is none of C, A, M and F
+
+Sinks:
+	NullSink: ignores every event
+	CounterSink: counts events by their type
+	JsonLinesSink: writes one JSON object per event to a file
+	VerboseSink: prints events as the simulator always did, including memory dumps
+'''
+import json
+import sys
+from collections import namedtuple, Counter
+
+ProcessCreated = namedtuple('ProcessCreated', 'time process size')
+MemoryAllocated = namedtuple('MemoryAllocated', 'time process size total')
+NoSpace = namedtuple('NoSpace', 'time process size op')
+AccessHit = namedtuple('AccessHit', 'time process address frame')
+AccessAfterFault = namedtuple('AccessAfterFault', 'time process address frame')
+PageFault = namedtuple('PageFault', 'time process address')
+FaultHandled = namedtuple('FaultHandled', 'time process')
+Eviction = namedtuple('Eviction', 'time process page_id')
+SwapIn = namedtuple('SwapIn', 'time process page_id frame')
+Segfault = namedtuple('Segfault', 'time process address size')
+OutOfMemory = namedtuple('OutOfMemory', 'time process size')
+Prefetch = namedtuple('Prefetch', 'time process page_id frame')
+PrefetchHit = namedtuple('PrefetchHit', 'time process page_id')
+PrefetchWasted = namedtuple('PrefetchWasted', 'time process page_id')
+MemoryFreed = namedtuple('MemoryFreed', 'time process size total')
+ProcessTerminated = namedtuple('ProcessTerminated', 'time process size')
+InvalidOperation = namedtuple('InvalidOperation', 'time process op')
+'''
+Base sink, receives the Manager it reports when attached to it.
+'''
+class NullSink:
+	def bind(self, mngr):
+		pass
+	def emit(self, event):
+		pass
+'''
+Counts events by type name, see counts.
+'''
+class CounterSink(NullSink):
+	def __init__(self):
+		self.counts = Counter()
+	def emit(self, event):
+		self.counts[type(event).__name__] += 1
+'''
+Writes each event as a JSON object in its own line, with the type in the 'event' key.
+'''
+class JsonLinesSink(NullSink):
+	def __init__(self, out=None):
+		self.out = out if out is not None else sys.stdout
+	def emit(self, event):
+		record = {'event': type(event).__name__}
+		record.update(event._asdict())
+		self.out.write(json.dumps(record) + '\n')
+'''
+Prints the events on screen, dumping the memories before and after each page fault.
+'''
+class VerboseSink(NullSink):
+	def __init__(self):
+		self.mngr = None
+	def bind(self, mngr):
+		self.mngr = mngr
+	def emit(self, e):
+		kind = type(e)
+		if kind is ProcessCreated:
+			print('-Process {} created. Size: {}.'.format(e.process, e.size))
+		elif kind is MemoryAllocated:
+			print('-Memory allocated to process {}. New size: {}'.format(e.process, e.total))
+		elif kind is MemoryFreed:
+			print('-Memory freed by process {}. New size: {}'.format(e.process, e.total))
+		elif kind is ProcessTerminated:
+			print('-Process {} terminated. Size: {}.'.format(e.process, e.size))
+		elif kind is AccessHit or kind is AccessAfterFault:
+			print('-Process {} accessed address {} at page {}'.format(e.process, e.address, e.frame))
+		elif kind is NoSpace:
+			if e.op == 'C':
+				print('No size to create new process with size {}'.format(e.size))
+			else:
+				print('No space to allocate for {}'.format(e.process))
+		elif kind is PageFault:
+			print('###Page fault###')
+			if e.address is not None:
+				print('{} could not access address {}'.format(e.process, e.address))
+			print('###Before###')
+			self.mngr.print_memories()	# memory status before page fault
+		elif kind is FaultHandled:
+			print('###After###')
+			self.mngr.print_memories()	# memory status after page fault
+		elif kind is Segfault:
+			if e.address is None:
+				print('Segmentation fault: Process {} does not exist'.format(e.process))
+			else:
+				print('Segmentation fault: Process {} tried to access {}. Size: {}'.format(e.process, e.address, e.size))
+		elif kind is OutOfMemory:
+			print('Out of Memory')
+		elif kind is InvalidOperation:
+			print('Invalid operation')
+		elif kind is Prefetch:
+			print('-Process {} prefetched page {} at page {}'.format(e.process, e.page_id, e.frame))
@@ -0,0 +1,102 @@
+'''
+Compact table of page frames used by the Memory to store its pages.
+Instead of one (time, Page, page_id) tuple per slot, each field is kept in its own
+array column, so the table costs 28 bytes per slot (the indexes of the Memory add more per
+stored page, see memory.py) and touching a page only writes numbers in place:
+	owner: interned id of the process owning the slot (FREE for empty slots)
+	page_id: the index of the page in its process' pagetable
+	time: the time of execution that the page was last accessed
+	stored: how much of the page is in use, in bytes
+	free: bytes left to allocate in the page
+Process names are interned to integer ids (see intern and name). The id of a process that
+ended is released and given to the next new name, so the names don't pile up.
+Page objects are only created when a page leaves the table (see get).
+'''
+from array import array
+from page import Page
+
+FREE = -1	# owner of empty slots
+class FrameTable:
+	def __init__(self, n_frames, page_size):
+		self.n_frames = n_frames
+		self.page_size = page_size
+		self.owner = array('i', [FREE])*n_frames
+		self.page_id = array('q', [0])*n_frames
+		self.time = array('q', [0])*n_frames
+		self.stored = array('i', [0])*n_frames
+		self.free = array('i', [0])*n_frames
+		self.names = []		# owner id -> process name (None for released ids)
+		self.ids = {}		# process name -> owner id
+		self.released = []	# owner ids to be reused
+	'''
+	Returns the integer id of a process name, creating it if needed.
+	'''
+	def intern(self, process):
+		oid = self.ids.get(process)
+		if oid is None:
+			if self.released:
+				oid = self.released.pop()
+				self.names[oid] = process
+			else:
+				oid = len(self.names)
+				self.names.append(process)
+			self.ids[process] = oid
+		return oid
+	'''
+	Releases the id of a process name, which must own no slot, so it can be reused.
+	'''
+	def release(self, process):
+		oid = self.ids.pop(process, None)
+		if oid is not None:
+			self.names[oid] = None
+			self.released.append(oid)
+	'''
+	Rebuilds ids and released from names, after they were replaced (see snapshot.py).
+	'''
+	def reload_names(self, names):
+		self.names = names
+		self.ids = dict((name, oid) for oid, name in enumerate(names) if name is not None)
+		self.released = [oid for oid, name in enumerate(names) if name is None]
+	'''
+	Returns the process name of an owner id.
+	'''
+	def name(self, oid):
+		return self.names[oid]
+	'''
+	Stores a page in slot idx.
+	'''
+	def set(self, idx, process, page_id, time, stored):
+		self.owner[idx] = self.intern(process)
+		self.page_id[idx] = page_id
+		self.time[idx] = time
+		self.stored[idx] = stored
+		self.free[idx] = self.page_size - stored
+	'''
+	Marks slot idx as empty.
+	'''
+	def clear(self, idx):
+		self.owner[idx] = FREE
+	'''
+	Returns if there is a page stored in slot idx.
+	'''
+	def is_used(self, idx):
+		return self.owner[idx] != FREE
+	'''
+	Returns if slot idx holds the page page_id of process, without creating objects.
+	'''
+	def holds(self, idx, process, page_id):
+		oid = self.ids.get(process)
+		return oid is not None and self.owner[idx] == oid and self.page_id[idx] == page_id
+	'''
+	Returns the page stored in slot idx as a (time, Page, page_id) tuple, or a Nonetype object.
+	'''
+	def get(self, idx):
+		oid = self.owner[idx]
+		if oid == FREE:
+			return None
+		return (self.time[idx], Page(self.names[oid], self.page_size, self.stored[idx], idx), self.page_id[idx])
+	'''
+	Returns the number of bytes used by the columns.
+	'''
+	def nbytes(self):
+		return sum(c.itemsize*len(c) for c in (self.owner, self.page_id, self.time, self.stored, self.free))
@@ -1,124 +1,158 @@
 '''
 This system was made to simulate a Virtual Memory Manager as in arbitrary Operational Systems.
-It takes as input a .txt file and simulates processes and accesses to memories in two ways: Sequential and Random.
+It takes as input a trace file and simulates processes and accesses to memories in two ways: Sequential and Random.
 In Sequential mode, it'll read the file line by line interpreting commands as below:
-	C | A | M process size | address | size
+	C | A | M | F process size | address | size | [size]
 Where:
 	process: process name to be created/access memory/allocate memory
 	C: Create process with name and size as specified
 	A: Access address in memory with process and address as specified
 	M: Allocate memory for process with specified size
+	F: Free memory of process with specified size, or terminate it if no size is given
 
-In Random mode it will generate new threads that create a process each and then randomly solicitates
-accesses to memory and memory allocation to this process in mutual exclusion.
+In Random mode it will generate new processes from time to time, each one randomly solicitating
+accesses to memory and memory allocation, driven by a virtual clock (see scheduler.py).
+The random choices come from a seed, so runs with the same seed are the same.
 The Random mode has a timeout defined in RAND_TIMEOUT variable.
+Its arrivals can be fixed or exponential (--arrivals), and allocations can come in bursts
+(--burst-prob and --burst-max).
+
+The contents of the pages can be kept too, the disc ones in a file mapped in memory
+(see pagestore.py), so swapping copies real bytes.
+The trace file is given in the command line (INPUT_FILE by default), as text or compiled
+to the binary format by the --compile option (see tracefile.py).
+A sequential run can save its state after some operations (--snapshot and --snapshot-at),
+and a later run of the same trace can start from that state (--resume), see snapshot.py.
+With --events json (or a profile written to the screen) the screen carries machine-readable
+lines only, and the header and summaries go to stderr instead.
+The --profile option reports counts and latency histograms of the operations and of their
+inner phases at the end of the run, as JSON or Prometheus text (see profiler.py).
 
 The execution will deal with Page faults, segmentation faults and lack of memory.
 
 Author: Pedro Braga Alves
 Date: Jun 26, 2017
 '''
-import time as tm
-import random as rd
+import argparse
+import itertools
+import sys
 from memory import Memory
-from process import Process
 from manager import Manager
-from threading import Thread, Lock
+from policy import POLICIES
+from pagestore import BufferStore, MmapStore
+from scheduler import Scheduler, RandomWorkload, PATTERNS, ARRIVALS
+from profiler import Profiler, FORMATS
+import tracefile
+import snapshot
+import events
 
-INPUT_FILE = 'test.txt'		### input file for execution
-RAND_TIMEOUT = 30		### timeout constant for stopping random mode
-mutex = Lock()			### lock for random mutual exclusion
-time_counter = 0		### time counter for random mode
+INPUT_FILE = 'test.txt'		### default input file for execution
+RAND_TIMEOUT = 30		### timeout constant for stopping random mode (in virtual time)
 
-'''
-Method for running operations received by parameters.
-It verifies which operation may run, and then calls its respective method.
-'''
-def execute_operation(operation, process, num, time):
-	if operation == 'C':	### calls process creation method
-		mngr.create_process(process, num, time)
-	elif operation == 'A':	### calls memory access method
-		mngr.access_memory(process, num, time)
-	elif operation == 'M':	### call memory allocation method
-		mngr.allocate_memory(process, num, time)
-	else:
-		print('Invalid operation')
 '''
 Starts random mode.
-It starts new threads that create a new process each and then make
-randomic calls for memory access and allocation.
-'''
-def random_mode():
-	while True:
-		if time_counter%(RAND_TIMEOUT//5)==0:		# verifier to create new threads less often
-			t = Thread(target=create_random_access)	# instantiates and starts a new thread with a process and
-			t.start()				# random accesses
-			tm.sleep(1)
-		if time_counter>RAND_TIMEOUT:	# stops when the counter reachs the timeout
-			break
+Runs a random workload (see scheduler.py) on a virtual clock until the timeout:
+new processes arrive from time to time (every arrival ticks on average, timeout//5 by
+default) and then make randomic calls for memory access and allocation, some of them
+in bursts.
 '''
-Tries to create a new proccess and then does multiple randomic operations.
-As it's called in a thread, uses a lock to delimitate critical sections.
-'''
-def create_random_access():
-	global mutex
-	global time_counter
-	name = 'p'+str(len(mngr.process_list))	# process name based on dictionary length
-	ram_size = ram.size			# memory size in bytes
-	size = rd.randint(1, ram_size/2)	# generates random process size between 1 and half the memory size
-	with mutex:				# critical section
-		created = mngr.create_process(name, size, time_counter)	# tries to create a new proccess
-		time_counter = time_counter + 1				# upgrades execution time
-		tm.sleep(1)	# sleep to see running better
-	if not created: return						# if the process was not created, return
-	while True:							# with the created process
-		add = int((time_counter*time_counter*rd.random())%ram_size)	# random address based on execution time and memory size
-		with mutex:			# critical section
-			mngr.access_memory(name, add, time_counter)	# calls memory access method
-			time_counter = time_counter + 1		# update execution time
-			tm.sleep(1)
-		if time_counter%10==0:				# verifier to allocate memory less often
-			al_size = rd.randint(1, ram_size/2)	# random allocation size
-			with mutex:		# critical section
-				mngr.allocate_memory(name, al_size, time_counter)	# calls allocation method
-				time_counter = time_counter + 1			# update execution time
-				tm.sleep(1)
-		if time_counter>RAND_TIMEOUT:	# if execution times out, stops thread
-			break
-		tm.sleep(1)
-		
-			
+def random_mode(mngr, seed, pattern, timeout=RAND_TIMEOUT, arrivals='fixed', arrival=None,
+		burst_prob=0.0, burst_max=4):
+	sched = Scheduler()
+	workload = RandomWorkload(mngr, sched, seed=seed, pattern=pattern,
+		arrival=arrival if arrival is not None else max(1, timeout//5),
+		burst_prob=burst_prob, burst_max=burst_max, arrivals=arrivals)
+	workload.start()
+	return sched.run(timeout)	# returns the number of events run
+
+
 if __name__ == '__main__':
-	with open(INPUT_FILE, 'r') as f:	# open input file in read mode
-		mode = int(f.readline())
-		switch_method = f.readline()[:-1]	### reads header of the input and declares variables
-		page_size = int(f.readline())
-		ram_size = int(f.readline())/page_size
-		disc_size = int(f.readline())/page_size
-		ram = Memory(page_size, ram_size)
-		disc = Memory(page_size, disc_size)
-		global mngr
-		time = 0
-		if switch_method != 'lru' and switch_method != 'sequential':	### verifies if switch method is valid or not
-			print('Please use \'lru\' or \'sequential\' as memory switch method')	# requires a valid entry
+	parser = argparse.ArgumentParser(description='Virtual Memory Manager simulator.')
+	parser.add_argument('trace', nargs='?', default=INPUT_FILE, help='input trace, text or compiled')
+	parser.add_argument('--compile', metavar='OUTPUT', help='compile the text trace to OUTPUT and exit')
+	parser.add_argument('--events', choices=['verbose', 'counters', 'json', 'none'], default='verbose',
+		help='how to report the events of the run (see events.py)')
+	parser.add_argument('--disc-file', metavar='PATH',
+		help='keep the contents of the disc pages in a file mapped in memory (implies --ram-contents)')
+	parser.add_argument('--ram-contents', action='store_true', help='keep the contents of the RAM pages')
+	parser.add_argument('--prefetch', type=int, default=0,
+		help='pages brought ahead on sequential or strided page faults')
+	parser.add_argument('--snapshot', metavar='PATH', help='save the state of a sequential run to PATH')
+	parser.add_argument('--snapshot-at', type=int, metavar='N',
+		help='operations run before saving the snapshot (all of them by default)')
+	parser.add_argument('--resume', metavar='PATH', help='start a sequential run from the snapshot at PATH')
+	parser.add_argument('--profile', choices=FORMATS, help='report latencies of operations and phases')
+	parser.add_argument('--profile-out', metavar='PATH', help='file of the profile report (screen by default)')
+	parser.add_argument('--profile-every', type=int, default=0, metavar='N',
+		help='also report the profile every N operations')
+	parser.add_argument('--seed', type=int, default=0, help='seed of the random mode')
+	parser.add_argument('--pattern', choices=sorted(PATTERNS), default='uniform',
+		help='access pattern of the random mode')
+	parser.add_argument('--arrivals', choices=sorted(ARRIVALS), default='fixed',
+		help='spacing of process arrivals in the random mode')
+	parser.add_argument('--arrival', type=int, metavar='TICKS',
+		help='mean ticks between arrivals in the random mode (timeout/5 by default)')
+	parser.add_argument('--burst-prob', type=float, default=0.0,
+		help='probability that an allocation of the random mode is a burst')
+	parser.add_argument('--burst-max', type=int, default=4, help='most allocations in a burst')
+	parser.add_argument('--timeout', type=int, default=RAND_TIMEOUT, help='virtual time to run the random mode')
+	args = parser.parse_args()
+	if args.burst_max < 2:
+		parser.error('--burst-max must be at least 2')
+	if args.compile:				# only compiles the trace
+		n = tracefile.compile_trace(args.trace, args.compile)
+		print('{} operations written to {}'.format(n, args.compile))
+	else:
+		trace = tracefile.open_trace(args.trace)	# text or compiled trace
+		mode, switch_method, page_size, ram_size, disc_size = trace.header	### reads header of the input and declares variables
+		ram_size = ram_size//page_size
+		disc_size = disc_size//page_size
+		ram_contents = args.ram_contents or args.disc_file is not None	# swapping copies only between two stores
+		ram = Memory(page_size, ram_size, BufferStore(ram_size, page_size) if ram_contents else None)
+		disc = Memory(page_size, disc_size, MmapStore(args.disc_file, disc_size, page_size) if args.disc_file else None)
+		if switch_method not in POLICIES:	### verifies if switch method is valid or not
+			print('Please use one of {} as memory switch method'.format(', '.join(sorted(POLICIES))))	# requires a valid entry
 		else:
-			### prints header information
-			print('Mode: {}. Switch method: {}'.format('Sequential' if mode==0 else 'Random', switch_method))
-			print('Ram size: {}. Disc size: {}'.format(ram_size*page_size,disc_size*page_size))
-			print('Page size: {}'.format(page_size))
-			mngr = Manager(ram, disc, switch_method, page_size)	# instantiate Manager to execute tasks and manage memory
+			### prints header information, on stderr when the screen gets JSON events or the profile
+			info = sys.stderr if args.events == 'json' or (args.profile and not args.profile_out) else sys.stdout
+			print('Mode: {}. Switch method: {}'.format('Sequential' if mode==0 else 'Random', switch_method), file=info)
+			print('Ram size: {}. Disc size: {}'.format(ram_size*page_size,disc_size*page_size), file=info)
+			print('Page size: {}'.format(page_size), file=info)
+			sink = {'verbose': events.VerboseSink, 'counters': events.CounterSink,
+				'json': events.JsonLinesSink, 'none': events.NullSink}[args.events]()
+			mngr = Manager(ram, disc, switch_method, page_size, sink, args.prefetch)	# instantiate Manager to execute tasks and manage memory
+			offset, time = snapshot.load_snapshot(args.resume, mngr) if args.resume and mode == 0 else (0, 0)
+			profiler = None
+			if args.profile:	# times the operations from here on
+				profiler = Profiler(args.profile, open(args.profile_out, 'w') if args.profile_out else None,
+					args.profile_every)
+				profiler.bind(mngr)
 			if mode == 0:		# if mode is sequential
-				while True:	# reads file
-					line = f.readline()	### read new line and breaks into words
-					if line == '':
-						break
-					ops = line.split(' ')
-					op = ops[0]		### sets variables and calls execution method
-					process = ops[1]
-					num = int(ops[2])
-					execute_operation(op, process, num, time)
-					time = time + 1		### upgrade execution time for sequential mode
+				ops = trace.ops(start=offset)
+				if args.snapshot:	# runs up to the snapshot and saves it
+					end = tracefile.replay(mngr, itertools.islice(ops, args.snapshot_at), time)
+					snapshot.save_snapshot(args.snapshot, mngr, offset+end-time, end)
+					time = end
+				tracefile.replay(mngr, ops, time)	# runs the rest of the trace
 			elif mode == 1:		# if mode is randomic
-				random_mode()	# calls random mode method
+				random_mode(mngr, args.seed, args.pattern, args.timeout, args.arrivals, args.arrival,
+					args.burst_prob, args.burst_max)	# calls random mode method
 			else:			# if mode is invalid reports to user and terminates
-				print('Please use 0 or 1 to select execution mode (sequential or random).')
+				print('Please use 0 or 1 to select execution mode (sequential or random).', file=info)
+			if args.events == 'counters':	# prints how many events of each type happened
+				for name, n in sorted(sink.counts.items()):
+					print('{}: {}'.format(name, n), file=info)
+				if ram.store is not None and disc.store is not None:	# swap traffic
+					print('Bytes out: {}. Bytes in: {}'.format(mngr.bytes_out, mngr.bytes_in), file=info)
+				wasted = mngr.fragmentation()	# bytes left free in the pages of each process
+				print('Wasted bytes: {}'.format(sum(wasted.values())), file=info)
+				for process, n in sorted(wasted.items()):
+					print('Wasted bytes of {}: {}'.format(process, n), file=info)
+			if profiler is not None:	# final report
+				profiler.dump()
+				if args.profile_out:
+					profiler.out.close()
+		trace.close()
+		for m in (ram, disc):
+			if m.store is not None:
+				m.store.close()
@@ -2,17 +2,42 @@
 Management class for dealing with Memories and Processes.
 Initialized with memory objects, a switch policy and page size, it makes calls for the Memory
 objects for creating processes, accessing addresses and allocating memory.
+It can be called from many threads: each process has a lock for its page table, and the
+frame lock is only held while pages are allocated, evicted or swapped, so accesses that
+hit RAM from different processes run without waiting for each other.
+With prefetch on, a page fault of a process walking its pages in order (or by a constant
+stride) also brings the next prefetch pages of the walk from disc in the same fault.
+When the memories keep the contents of their pages (see pagestore.py), swapping copies
+them along, and processes can read and write their addresses (see read_memory).
+Processes can give memory back or terminate (see free_process), releasing their pages
+in both memories, so long runs don't fill them with pages no one will access.
+Everything that happens is reported as an event to a sink (see events.py), which
+prints it by default.
 Author: Pedro Braga Alves
 Date: Jun 26, 2017
 '''
+import threading
 from process import Process
+from policy import get_policy
+from events import (VerboseSink, ProcessCreated, MemoryAllocated, NoSpace, AccessHit, AccessAfterFault, PageFault,
+	FaultHandled, Eviction, SwapIn, Segfault, OutOfMemory, Prefetch, PrefetchHit, PrefetchWasted,
+	MemoryFreed, ProcessTerminated)
 class Manager:
-	def __init__(self, ram, disc, switch, psize):
+	def __init__(self, ram, disc, switch, psize, sink=None, prefetch=0):
 		self.ram = ram
 		self.disc = disc
 		self.process_list = {}		# process dictionary to save Process objects by their name
 		self.page_size = psize
 		self.switch_method = switch
+		self.ram.set_policy(get_policy(switch, ram.n_pages))	# the policy picks pages to leave RAM
+		self.sink = sink if sink is not None else VerboseSink()	# receives the events, see events.py
+		self.sink.bind(self)
+		self.frame_lock = threading.RLock()	# held while pages move in or out of the memories
+		self.list_lock = threading.Lock()	# held while the process dictionary changes
+		self.prefetch = prefetch		# pages brought ahead on sequential or strided faults
+		self.prefetched = set()			# (process, page_id) prefetched and not accessed yet
+		self.bytes_out = 0			# contents copied from RAM to disc, in bytes
+		self.bytes_in = 0			# contents copied from disc to RAM, in bytes
 	'''
 	Print memories status: see Memory.py for more information.
 	'''
@@ -22,34 +47,120 @@ class Manager:
 		print('##Disc##')
 		self.disc.print_status()
 	'''
+	Copies the contents of pages moved from memory src to the slots of memory dst,
+	when both memories keep contents (see pagestore.py). Returns the bytes copied.
+	'''
+	def copy_pages(self, src, dst, pages, slots):
+		if src.store is None or dst.store is None:
+			return 0
+		for (page, pageid), idx in zip(pages, slots):
+			dst.store.page(idx)[:] = src.store.page(page.frame)
+		return len(slots)*self.page_size
+	'''
+	Moves up to n pages chosen by the switch policy from RAM to disc, as many as fit in the disc.
+	Returns the number of pages moved.
+	'''
+	def swap_out(self, time, n=1):
+		pages = self.ram.evict(min(n, self.disc.free_slots()))	# picks pages from memory
+		slots = self.disc.store_pages(time, pages)	# puts pages in disc
+		self.bytes_out = self.bytes_out + self.copy_pages(self.ram, self.disc, pages, slots)
+		for page, pageid in pages:
+			self.sink.emit(Eviction(time, page.process, pageid))
+			if self.prefetched and (page.process, pageid) in self.prefetched:	# it was never accessed
+				self.prefetched.discard((page.process, pageid))
+				self.sink.emit(PrefetchWasted(time, page.process, pageid))
+		return len(pages)
+	'''
+	Brings pages of a process back from disc to RAM, making room for all of them at once,
+	and updates its pagetable. Returns the page ids brought back.
+	Pages leave the disc only after the pages switched with them are stored there, so their
+	contents are never overwritten. When the disc is full, pages are exchanged instead: the
+	contents of the pages coming back are kept aside while their slots receive RAM pages.
+	'''
+	def swap_in(self, p, page_ids, time):
+		page_ids = [pid for pid in page_ids if self.disc.find_page(p.name, pid) is not None]	# pages found in disc
+		missing = len(page_ids) - self.ram.free_slots()
+		if missing > 0:				# switches pages from memory with disc
+			self.swap_out(time, missing)
+		free = self.ram.free_slots()
+		exchanged, kept = [], []
+		if len(page_ids) > free and self.ram.allocated > 0:	# the disc has no room left
+			exchanged = self.disc.take_pages(p.name, page_ids[free:free+self.ram.allocated])
+			if self.disc.store is not None:
+				kept = [bytes(self.disc.store.page(page.frame)) for page, pageid in exchanged]
+			self.swap_out(time, len(exchanged))	# RAM pages go to the slots just left
+		pages = self.disc.take_pages(p.name, page_ids[:free])	# gets pages from disc using page ids, see Memory.py
+		slots = self.ram.store_pages(time, pages)	# stores disc pages in memory
+		self.bytes_in = self.bytes_in + self.copy_pages(self.disc, self.ram, pages, slots)
+		if exchanged:
+			more = self.ram.store_pages(time, exchanged)
+			if self.ram.store is not None:
+				for idx, data in zip(more, kept):
+					self.ram.store.page(idx)[:] = data
+					self.bytes_in = self.bytes_in + self.page_size
+			pages = pages + exchanged
+			slots = slots + more
+		for (page, pageid), idx in zip(pages, slots):
+			p.pagetable[pageid] = idx	# pagetable gets the memory index of the page
+			self.sink.emit(SwapIn(time, p.name, pageid, idx))
+		return [pageid for page, pageid in pages]
+	'''
+	Returns the page ids to bring along with page_id on a page fault of process p:
+	the next prefetch pages of its walk, when the last faults were sequential or had the
+	same stride, which are on disc.
+	'''
+	def prefetch_pages(self, p, page_id):
+		stride = page_id - p.last_fault if p.last_fault is not None else 0
+		confirmed = stride == 1 or (stride != 0 and stride == p.stride)
+		p.last_fault = page_id
+		p.stride = stride
+		if not self.prefetch or not confirmed:
+			return []
+		pages = []
+		for k in range(1, self.prefetch+1):
+			pid = page_id + k*stride
+			if pid < 0 or pid >= len(p.pagetable):	# out of the process
+				break
+			if self.disc.find_page(p.name, pid) is not None:
+				pages.append(pid)
+		return pages
+	'''
+	Makes room in RAM for size bytes of a process after an allocation has failed,
+	moving all the pages needed to disc at once. Returns False if there is no space left.
+	'''
+	def make_room(self, process, size, time):
+		n = min(self.ram.shortage(process, size), self.disc.free_slots(), self.ram.allocated)	# pages that can move
+		if n == 0:			# if there are no space in disc (or no pages in RAM), there are no space left
+			return False
+		self.sink.emit(PageFault(time, process, None))	# if there are space in disc, dumps memory to get more space
+		moved = self.swap_out(time, n)
+		self.sink.emit(FaultHandled(time, process))
+		return moved > 0
+	'''
 	Tries to allocate more memory for a process:
 		process: name of the process to receive memory
 		size: how much memory it wants to allocate
 		time: current time of execution based on operations done
 	'''
 	def allocate_memory(self, process, size, time):
-		p = self.process_list[process]	# get current process from dictionary
-		pid = len(p.pagetable)		# if new pages are created, the process will have 
-						# new pages which id starts at its pagetable length
-		pages = self.ram.allocate_page(time, process, size, page_id=pid)	# tries to allocate memory, see Memory.py
-		if pages is None: 						# if allocation was not successful
-			print('No space to allocate for {}'.format(process))	# inform user
-			if self.disc.is_full():			# if there are no space in disc, there are no space left
-				print('Out of Memory')
-				return False
-			else:
-				print('###Page fault###')	# if there are space in disc, dumps memory to get more space
-				print('###Before###')
-				self.print_memories()		# memory status before memory dump
-				page, pageid = self.ram.get_page_by_method(self.switch_method)	# picks a page from memory
-				self.disc.on_new_page((time,page,pageid))			# puts page in disc
-				print('###After###')
-				self.print_memories()		# memory status after memory dump
-				return self.allocate_memory(process, size, time)		# tries to allocate memory again
-		else:
-			p.on_page_allocation(pages)	# if allocation was successful, update process info
+		p = self.process_list.get(process)	# get current process from dictionary
+		if p is None:			# it doesn't exist or has ended
+			self.sink.emit(Segfault(time, process, None, 0))
+			return False
+		with p.lock, self.frame_lock:
+			pid = len(p.pagetable)		# if new pages are created, the process will have
+							# new pages which id starts at its pagetable length
+			while True:
+				pages = self.ram.allocate_page(time, process, size, page_id=pid)	# tries to allocate memory, see Memory.py
+				if pages is not None:		# if allocation was successful
+					break
+				self.sink.emit(NoSpace(time, process, size, 'M'))	# inform user
+				if size > self.ram.size or not self.make_room(process, size, time):	# if there are no space at all
+					self.sink.emit(OutOfMemory(time, process, size))
+					return False
+			p.on_page_allocation(pages)	# update process info
 			p.on_mem_allocation(size)	# reports and returns
-			print('-Memory allocated to process {}. New size: {}'.format(process, p.size))
+			self.sink.emit(MemoryAllocated(time, process, size, p.size))
 			return True
 	'''
 	Tries to access certain memory address from a process:
@@ -58,30 +169,40 @@ class Manager:
 		time: current time of execution based on operations done
 	'''
 	def access_memory(self, process, address, time):
-		p = self.process_list[process]	# get current process from dictionary
-		if p.size <= address:	# if it's trying to access an address it doesn't have, just report
-			print('Segmentation fault: Process {} tried to access {}. Size: {}'.format(process, address, p.size))
-		else:
+		p = self.process_list.get(process)	# get current process from dictionary
+		if p is None:			# it doesn't exist or has ended
+			self.sink.emit(Segfault(time, process, address, 0))
+			return
+		with p.lock:
 			page_id = address//self.page_size	# the page id identifies which page from the process it's trying to access
-			n_page = p.pagetable[page_id]	# gets the memory index from the pagetable of the process using the page id
-							# Example: 
-							# 	p.pagetable[1] == 0 means that the page 1 from the process
-							#  	is the page 0 from the memory
-			result = self.ram.access_address(process, time, n_page, page_id)	# tries to access memory address, see Memory.py
-			if result is None:			# if could not access a valid address
-				print('###Page fault###')	# page fault occurs
-				print('{} could not access address {}'.format(process, address))
-				print('###Before###')			
-				self.print_memories()	# memory status before page fault
-				disc_page = self.disc.get_page_by_address(process, page_id)	# gets page from disc using page id, see Memory.py
-				ram_page = self.ram.get_page_by_method(self.switch_method)	# gets page from memory to switch with disc
-				self.disc.on_new_page((time,)+ram_page)			# stores memory page in disc
-				p.pagetable[page_id] = self.ram.on_new_page((time,)+disc_page) # stores disc page in memory, returning its memory index
-				print('###After###')
-				self.print_memories()	# memory status after page fault
-				self.access_memory(process, address, time)	# and tries to access memory address again
-			else:	# if address was accessed, reports
-				print('-Process {} accessed address {} at page {}'.format(process, address, p.pagetable[page_id]))
+			if p.size <= address or page_id >= len(p.pagetable):	# if it's trying to access an address it doesn't have, just report
+				self.sink.emit(Segfault(time, process, address, p.size))
+				return
+			faulted = False			# if the page had to be brought back
+			while True:
+				n_page = p.pagetable[page_id]	# gets the memory index from the pagetable of the process using the page id
+								# Example:
+								# 	p.pagetable[1] == 0 means that the page 1 from the process
+								#  	is the page 0 from the memory
+				result = self.ram.access_address(process, time, n_page, page_id)	# tries to access memory address, see Memory.py
+				if result is not None:	# if address was accessed, reports
+					self.sink.emit((AccessAfterFault if faulted else AccessHit)(time, process, address, n_page))
+					if self.prefetched and (process, page_id) in self.prefetched:	# first access of a prefetched page
+						self.prefetched.discard((process, page_id))
+						self.sink.emit(PrefetchHit(time, process, page_id))
+					return
+				with self.frame_lock:	# if could not access a valid address
+					self.sink.emit(PageFault(time, process, address))	# page fault occurs
+					ahead = self.prefetch_pages(p, page_id)
+					swapped = self.swap_in(p, [page_id]+ahead, time)	# the page and the pages ahead
+					for pid in swapped[1:]:
+						self.prefetched.add((process, pid))
+						self.sink.emit(Prefetch(time, process, pid, p.pagetable[pid]))
+					self.sink.emit(FaultHandled(time, process))
+				faulted = True
+				if not swapped or swapped[0] != page_id:	# the page is nowhere to be found
+					self.sink.emit(Segfault(time, process, address, p.size))
+					return
 	'''
 	Tries to create a new process and allocate it in the memory:
 		process: process name
@@ -90,23 +211,114 @@ class Manager:
 	'''
 	def create_process(self, process, size, time):
 		p = Process(process, size)	# creates a new process object
-		pages = self.ram.allocate_page(time, process, size)	# tries to allocate memory for the new process
-		if pages is None:				# if there was no space in memory
-			print('No size to create new process with size {}'.format(size))
-			if self.disc.is_full() and (self.ram.is_full() or size>self.ram.size-self.ram.mem_allocated):	# if there are no space at all
-				print('Out of Memory')	# it can't create the process
-				return False
-			else:
-				print('###Page fault###')	# if there are space, dumps memory
-				print('###Before###')
-				self.print_memories()	# memory status before page fault
-				page, pageid = self.ram.get_page_by_method(self.switch_method)	# get page from memory
-				self.disc.on_new_page((time,page,pageid))			# store page in disc
-				print('###After###')
-				self.print_memories()	# memory status after page fault
-				return self.create_process(process, size, time)		# tries to create proccess again
-		else :						# if allocated successfully
-			p.pagetable = pages			# pagetable of process is created (received from allocation method)
+		with self.frame_lock:
+			while True:
+				pages = self.ram.allocate_page(time, process, size)	# tries to allocate memory for the new process
+				if pages is not None:		# if allocated successfully
+					break
+				self.sink.emit(NoSpace(time, process, size, 'C'))
+				if size > self.ram.size or not self.make_room(process, size, time):	# if there are no space at all
+					self.sink.emit(OutOfMemory(time, process, size))	# it can't create the process
+					return False
+		p.pagetable = pages			# pagetable of process is created (received from allocation method)
+		with self.list_lock:
 			self.process_list[process] = p		# puts new process in dictionary
-			print('-Process {} created. Size: {}.'.format(process, size))	# reports success and returns
-			return True
+		self.sink.emit(ProcessCreated(time, process, size))	# reports success and returns
+		return True
+	'''
+	Frees memory of a process:
+		process: name of the process
+		size: how many bytes it gives back, from the end of its addresses; None (or
+			its whole size) terminates the process
+		time: current time of execution based on operations done
+	The bytes are given back by the pages of the process from the last one down, in RAM or
+	disc, and the pages left with no bytes are removed from the end of its pagetable.
+	'''
+	def free_process(self, process, size, time):
+		p = self.process_list.get(process)	# get current process from dictionary
+		if p is None:			# it doesn't exist or has ended
+			self.sink.emit(Segfault(time, process, None, 0))
+			return False
+		with p.lock:
+			with self.frame_lock:
+				terminate = size is None or size >= p.size
+				end = len(p.pagetable)		# pages from end on are removed
+				if terminate:
+					self.ram.free_pages(process)	# releases the slots owned by process
+					self.disc.free_pages(process)
+					self.ram.forget_process(process)	# and the id of its name
+					self.disc.forget_process(process)
+					end = 0
+				left = 0 if terminate else size	# bytes still to give back
+				while left > 0 and end > 0:	# trims the pages, last first
+					pid = end - 1
+					left = left - (self.ram.trim_page(process, pid, left) or self.disc.trim_page(process, pid, left))
+					if self.ram.find_page(process, pid) is not None or self.disc.find_page(process, pid) is not None:
+						break			# the page keeps some bytes
+					end = pid
+				if self.prefetched:
+					for pid in range(end, len(p.pagetable)):
+						self.prefetched.discard((process, pid))
+				del p.pagetable[end:]
+			if not terminate:
+				p.on_mem_allocation(-size)
+				self.sink.emit(MemoryFreed(time, process, size, p.size))
+				return True
+		with self.list_lock:			# out of the frame lock, as in create_process
+			self.process_list.pop(process, None)
+		self.sink.emit(ProcessTerminated(time, process, p.size))
+		return True
+	'''
+	Returns the bytes left free in the pages of each process, in RAM and disc together.
+	'''
+	def fragmentation(self):
+		wasted = self.ram.wasted()
+		for process, n in self.disc.wasted().items():
+			wasted[process] = wasted.get(process, 0) + n
+		return wasted
+	'''
+	Calls fn(slot, offset, start, n) for each page touched by the n bytes of a process from
+	address on, after accessing it (so it's brought to RAM), while holding the frame lock so
+	it doesn't leave RAM in the middle. start is the position in the bytes.
+	Returns False if some address can't be accessed (segmentation fault), and raises
+	ValueError if the RAM doesn't keep contents.
+	'''
+	def each_page(self, process, address, n, time, fn):
+		if self.ram.store is None:
+			raise ValueError('the RAM does not keep the contents of its pages')
+		p = self.process_list.get(process)
+		if p is None or address+n > p.size:
+			self.sink.emit(Segfault(time, process, address+n-1, p.size if p is not None else 0))
+			return False
+		with p.lock, self.frame_lock:
+			start = 0
+			while start < n:
+				page_id, offset = divmod(address+start, self.page_size)
+				count = min(n-start, self.page_size-offset)
+				self.access_memory(process, address+start, time)
+				idx = p.pagetable[page_id]
+				if not self.ram.table.holds(idx, process, page_id):	# access failed
+					return False
+				fn(idx, offset, start, count)
+				start = start + count
+		return True
+	'''
+	Reads size bytes of a process from address on, returning them or a Nonetype object
+	if they can't be accessed. Needs a RAM that keeps contents.
+	'''
+	def read_memory(self, process, address, size, time):
+		data = bytearray(size)
+		def read(idx, offset, start, count):
+			data[start:start+count] = self.ram.store.page(idx)[offset:offset+count]
+		if not self.each_page(process, address, size, time, read):
+			return None
+		return bytes(data)
+	'''
+	Writes bytes to a process from address on, returning if it was successful.
+	Needs a RAM that keeps contents.
+	'''
+	def write_memory(self, process, address, data, time):
+		view = memoryview(data)
+		def write(idx, offset, start, count):
+			self.ram.store.page(idx)[offset:offset+count] = view[start:start+count]
+		return self.each_page(process, address, len(data), time, write)
@@ -1,165 +1,397 @@
 '''
 This class represents an arbitrary memory, it's used to instantiate RAM and Disc.
 It takes as input the page size and the number of pages in the memory, and stores
-its total size, initialize a list of pages and how much memory is allocated (in pages or bytes).
-The list of pages starts with a None type for each position, and therefore replaced by a tuple
-that represents a page.
+its total size, initialize a table of pages and how much memory is allocated (in pages or bytes).
+The pages are stored in a FrameTable (see frametable.py), one array column per field, and
+every slot starts empty.
 
-Each page is represented by a tuple (time, page, page_id):
+Pages enter and leave the memory as tuples (time, page, page_id):
 	time: the time of execution that the page was last accessed
 	page: an Page object, see Page.py
 	page_id: the index of the page stored by its process 
 		(a page_id=1 for a process p means that this page is the page 1 in p's pagetable)
+Slots are handed out from the lowest index: slots never used are above a high water mark,
+and the slots released below it are kept in a heap, so no scan of the table is needed.
+Each stored page is also indexed by its key, the owner id of its process (see frametable.py)
+and its page id packed in one integer (see find_page), and each process keeps an array of the
+slots it owns (with the position of each slot in it), so a page or the pages of a process
+are found without scanning the list. Integer keys and arrays keep the footprint small and
+linear: with a million stored pages, the table, indexes and LRU policy take about 110 bytes
+per page (28 of them the table columns, most of the rest the index dictionary), plus about
+40 bytes for each page with free bytes.
+The pages of a process with free bytes are also kept in a list sorted by free bytes and slot
+(packed as free << SLOT_BITS | slot), so the rest of an allocation goes to the page it fits
+best, found by bisection (see find_room), and the bytes left unused in them are the
+fragmentation of the process (see wasted).
+Pages leaving a full memory are chosen by a replacement policy (see policy.py), which is
+notified whenever a page is stored, accessed or removed.
+The contents of the pages can be kept in a store (see pagestore.py), one block per slot.
+Every method that reads or changes the pages holds the memory lock, so they can be
+called from many threads; each call is short, as none of them scans the table.
 The Memory class is responsible for creating, adding, removing and accesing pages.
 The None types returned by this class are dealed by the Manager as a Page fault.
 
 Author: Pedro Braga Alves
 Date: Jun 27, 2017
 '''
-from page import Page
+import bisect
+import heapq
+import threading
+from array import array
+from frametable import FrameTable, FREE
+
+PAGE_BITS = 32		# bits of the page id in a key, see Memory.key
+SLOT_BITS = 32		# bits of the slot in the entries of the partial pages
+SLOT_MASK = (1 << SLOT_BITS) - 1
 class Memory:
 
-	def __init__(self, page_size, n_pages):		# initialize Memory with a page size and number of pages
+	def __init__(self, page_size, n_pages, store=None):	# initialize Memory with a page size and number of pages
 		self.page_size = page_size		
 		self.n_pages = n_pages
 		self.size = n_pages*page_size		# stores total size in bytes 
-		self.pagelist = []			# initialize an empty list of pages
+		self.table = FrameTable(n_pages, page_size)	# initialize an empty table of pages
 		self.allocated = 0			# total of pages stored in memory
 		self.mem_allocated = 0			# total of memory allocated in bytes
-		self.last_removed = None		# the index of the last page removed (for sequential method purposes)
-		for i in range(n_pages):		# initialize the empty list of pages with None types
-			self.pagelist.append(None)
+		self.last_removed = None		# the index of the last page removed by the replacement policy
+		self.policy = None			# replacement policy, see policy.py
+		self.high_water = 0			# slots from this index on were never used
+		self.free_frames = []			# heap of released slot indexes below high_water
+		self.index = {}				# key of (process, page_id) -> slot index
+		self.frames = {}			# process -> array of slot indexes owned by it
+		self.position = array('i', [0])*n_pages	# position of each used slot in the array of its process
+		self.partial = {}			# process -> sorted free << SLOT_BITS | slot of its pages with free bytes
+		self.lock = threading.RLock()		# guards the table, indexes and policy
+		self.store = store			# contents of the pages, see pagestore.py
+	'''
+	Sets the replacement policy of the memory, registering the pages already stored
+	from the least to the most recently accessed.
+	'''
+	def set_policy(self, policy):
+		self.policy = policy
+		if policy is not None:
+			t = self.table
+			policy.bind(t)
+			for i in sorted(self.index.values(), key=lambda i: (t.time[i], i)):
+				policy.on_insert(i, (t.names[t.owner[i]], t.page_id[i]))
+	'''
+	Returns the slot of the page page_id of process, or a Nonetype object if it isn't stored.
+	'''
+	def find_page(self, process, page_id):
+		oid = self.table.ids.get(process)
+		if oid is None:
+			return None
+		return self.index.get(oid << PAGE_BITS | page_id)
+	'''
+	Rebuilds the indexes from the table, after its columns were filled directly (see snapshot.py).
+	'''
+	def reindex(self):
+		with self.lock:
+			t = self.table
+			self.index = {}
+			self.frames = {}
+			self.partial = {}
+			for i, oid in enumerate(t.owner):
+				if oid != FREE:
+					process = t.names[oid]
+					self.index[oid << PAGE_BITS | t.page_id[i]] = i
+					self.add_frame(process, i)
+					self.add_partial(process, i)
+	'''
+	Adds slot i to the slots owned by process.
+	'''
+	def add_frame(self, process, i):
+		owned = self.frames.get(process)
+		if owned is None:
+			owned = self.frames[process] = array('i')
+		self.position[i] = len(owned)
+		owned.append(i)
+	'''
+	Removes slot i from the slots owned by process, moving the last one to its position.
+	'''
+	def drop_frame(self, process, i):
+		owned = self.frames[process]
+		last = owned.pop()
+		if last != i:
+			j = self.position[i]
+			owned[j] = last
+			self.position[last] = j
+		if not owned:
+			del self.frames[process]
 	'''
-	Allocate a new page in memory, searching for an empty slot and updating attributes.
+	Adds slot i of process to its pages with free bytes, if it has any.
+	'''
+	def add_partial(self, process, i):
+		free = self.table.free[i]
+		if free > 0:
+			bisect.insort(self.partial.setdefault(process, []), free << SLOT_BITS | i)
+	'''
+	Removes slot i of process from its pages with free bytes, if it's there.
+	'''
+	def drop_partial(self, process, i):
+		pages = self.partial.get(process)
+		if pages:
+			entry = self.table.free[i] << SLOT_BITS | i
+			j = bisect.bisect_left(pages, entry)
+			if j < len(pages) and pages[j] == entry:
+				del pages[j]
+				if not pages:
+					del self.partial[process]
+	'''
+	Allocate a new page in memory, taking the lowest empty slot and updating attributes.
 	Returns the index of the page allocated if successful, or a Nonetype object otherwise.
 	'''
 	def on_new_page(self, page):
-		for i,p in enumerate(self.pagelist):	# for each page in list
-			if p is None:			# if the page is None (slot is empty)
-				self.pagelist[i] = page	# new page is allocated
-				self.allocated = self.allocated+1			### update allocated pages and
-				self.mem_allocated = self.mem_allocated+page[1].stored	### size in bytes
-				return i		# returns new page's index
-		return None				# if there was no space for a new page, page fault
-	'''
-	Method that takes page arguments, verifies for space in memory and allocates a new Page object.
+		return self.store_page(page[0], page[1].process, page[2], page[1].stored)
+	'''
+	Same as on_new_page, but takes the page fields instead of a tuple with a Page object.
+	'''
+	def store_page(self, time, process, page_id, stored):
+		with self.lock:
+			if self.free_frames:			# lowest empty slot
+				i = heapq.heappop(self.free_frames)
+			elif self.high_water < self.n_pages:
+				i = self.high_water
+				self.high_water = i+1
+			else:					# if there was no space for a new page, page fault
+				return None
+			t = self.table
+			t.set(i, process, page_id, time, stored)	# new page is allocated
+			self.allocated = self.allocated+1			### update allocated pages and
+			self.mem_allocated = self.mem_allocated+stored		### size in bytes
+			self.index[t.owner[i] << PAGE_BITS | page_id] = i	### indexes the page by
+			self.add_frame(process, i)				### owner and page id
+			self.add_partial(process, i)
+			if self.policy is not None:		# lets the replacement policy know the new page
+				self.policy.on_insert(i, (process, page_id))
+			return i				# returns new page's index
+	'''
+	Method that takes page arguments, verifies for space in memory and stores new pages.
+	Sizes of a page or more take full pages, and what is left goes to an existing page of the
+	process with room for it, or to a new page. Nothing is stored unless everything fits.
 	Returns a list of indexes of pages allocated when successful, or a Nonetype object otherwise.
 	'''
 	def allocate_page(self, time, process, size, page_id=0):
-		if size>(self.size-self.mem_allocated):	# if there are no size in bytes available
-			return None			# page fault
-		p_size = self.page_size
-		if self.allocated == self.n_pages:	# if there are no space for new pages
-			p = Page(process, p_size, size)	# creates a new Page object
-			result = self.allocate_memory(process, size, time)	### tries to allocate more memory for
-			if result:						### the process instead of a new page
-				return []					### if memory was allocated, return no indexes
-			return None						### otherwise, page fault
-		
-		pages = []	# initialize a list of page indexes
-		pid = page_id
-		if size>=self.page_size:	# if the memory size needed is greater or equal to one page
-			size = size - p_size	# subtracts one page of the memory needed
-			p = Page(process, p_size, p_size)	# creates new Page fully stored
-			idx = self.on_new_page((time,p, pid))	# tries to allocate the new page in memory
-			if idx is None: return None		# if there was no free slot, page fault
-			pages.append(idx)			# appends page index to list otherwise
-			pid = pid + 1				# increments relative page id
-			if size>0:				# if there are memory needed left
-				aux = self.allocate_page(time, process, size, page_id=pid)	# recursively allocates more pages
-				if aux is None:		# if couldn't allocate, page fault
-					return aux	
-				pages.extend(aux)	# otherwise appends the indexes returned
-		elif size!=0:				# if the memory needed is less than one page
-			result = self.allocate_memory(process, size, time)	# tries to allocate memory in existing pages
-			if not result:						# if couldn't allocate
-				p = Page(process, p_size, size)	# creates a Page with the size left
-				idx = self.on_new_page((time,p, pid))	# tries to allocate the new Page
-				if idx is None: return None		# if couldn't, page fault
-				pages.append(idx)			# if allocated, appends page index
-		return pages	# return list of page indexes
+		with self.lock:
+			if size>(self.size-self.mem_allocated):	# if there are no size in bytes available
+				return None			# page fault
+			if self.allocated == self.n_pages:	# if there are no space for new pages
+				result = self.allocate_memory(process, size, time)	### tries to allocate more memory for
+				if result:						### the process instead of a new page
+					return []					### if memory was allocated, return no indexes
+				return None						### otherwise, page fault
+			full, rest = divmod(size, self.page_size)	# full pages and memory needed left
+			room = rest>0 and self.find_room(process, rest) is not None	# if the rest fits in an existing page
+			if full + (rest>0 and not room) > self.n_pages - self.allocated:	# if there are not enough free slots
+				return None						# page fault
+			pages = []	# initialize a list of page indexes
+			for pid in range(page_id, page_id+full):
+				pages.append(self.store_page(time, process, pid, self.page_size))	# new page fully stored
+			if room:
+				self.allocate_memory(process, rest, time)	# the rest goes to an existing page
+			elif rest>0:
+				pages.append(self.store_page(time, process, page_id+full, rest))	# new page with the size left
+			if self.store is not None:	# new pages start with zeros
+				for idx in pages:
+					self.store.clear(idx)
+			return pages	# return list of page indexes
+	'''
+	Returns the number of pages to be removed before allocate_page can store size bytes
+	for process (at least one, as it's called after allocate_page has failed).
+	'''
+	def shortage(self, process, size):
+		with self.lock:
+			full, rest = divmod(size, self.page_size)
+			slots = full + (rest>0 and self.find_room(process, rest) is None) - (self.n_pages - self.allocated)
+			space = size - (self.size - self.mem_allocated)		# bytes missing
+			return max(1, slots, -(-space//self.page_size))
+	'''
+	Returns the slot of the page owned by process with the fewest free bytes that still
+	has size bytes free (the lowest slot among them), or a Nonetype object.
+	'''
+	def find_room(self, process, size):
+		pages = self.partial.get(process)
+		if not pages:
+			return None
+		j = bisect.bisect_left(pages, size << SLOT_BITS)	# first page with at least size bytes free
+		if j == len(pages):
+			return None
+		return pages[j] & SLOT_MASK
+	'''
+	Returns the bytes left free in the pages of each process, as a dictionary.
+	'''
+	def wasted(self):
+		with self.lock:
+			return dict((process, sum(entry >> SLOT_BITS for entry in pages)) for process, pages in self.partial.items())
 	'''
 	Method for allocating memory for a process that already has pages stored.
-	Searches for a page owned by certain process and then tries to allocate more memory in it.
+	Searches the pages owned by certain process (see frames) and then tries to allocate more memory in it.
 	Returns True in success and False otherwise
 	'''
 	def allocate_memory(self, process, size, time):
-		success = False	
-		for i,p in enumerate(self.pagelist):			# for each page slot in memory
-			if p is not None and p[1].process == process:	# if there are a page stored owned by process
-				success = p[1].allocate(size)		# tries to allocate memory in this page
-				if success:				# if succeeded, update tuple in list of pages
-					self.pagelist[i] = (time, p[1], p[2])
-					break				# and breaks the loop
-		return success						# returns if succeeded or not
+		with self.lock:
+			i = self.find_room(process, size)	# page with space for size bytes
+			if i is None:
+				return False
+			self.drop_partial(process, i)
+			t = self.table			# update the page in the table
+			t.stored[i] = t.stored[i] + size
+			t.free[i] = t.free[i] - size
+			t.time[i] = time
+			self.add_partial(process, i)
+			self.mem_allocated = self.mem_allocated + size
+			if self.policy is not None:
+				self.policy.on_access(i)
+			return True
 	'''
 	Self-explaining method, returns if memory has pages left to store.
 	'''
 	def is_full(self):
 		return self.n_pages == self.allocated
 	'''
-	Removes and returns a page based on its selected method.
-	Deault is Least Recent Used, and the other option is a sequential method.
-	The sequential method iterates through the page list getting the first valid page
-	next to the last index removed.
-	'''
-	def get_page_by_method(self, method='lru'):
-		if method=='lru':				### if the method is lru
-			for i,page in enumerate(self.pagelist):	# for each page in list
-				if page is not None:		# if there are a valid page in slot
-					older = page[0]		# initialize the older page with the execution time of it
-					idx = i			# stores its index
-					break			# break the loop
-			for i,n in enumerate(self.pagelist):		# for each page in list
-				if n is not None and n[0] < older:	# if the page is valid and it was accessed before
-					older = n[0]		 	# this page is the new older page
-					idx = i				# stores its index
+	Removes and returns a page chosen by the replacement policy (see policy.py).
+	Returns its Page object and page id, or a Nonetype object if there is no policy or no page.
+	'''
+	def get_page_by_method(self):
+		with self.lock:
+			if self.policy is None:
+				return None
+			idx = self.policy.victim()	# slot of the page to be removed
+			if idx is None:
+				return None
+			self.last_removed = idx
 			p = self.remove_page(idx)	# remove the page from memory
 			return p[1], p[2]		# return its Page object and page id
-		elif method=='sequential':			### if the method is sequential
-			if self.last_removed is None:			# if there wasn't a last removed index
-				for i,n in enumerate(self.pagelist):	# for each page in list
-					if n is not None:		# if it's a valid page
-						p = self.remove_page(i)	# remove page
-						break			# break loop
-				return p[1], p[2]			# returns Page and page id
-			else:						# if there was a last removed index
-				n = (self.last_removed+1)%n_pages	# takes the next index
-				self.last_removed = n			# stores the new last removed
-				p = self.remove_page(n)			# remove page from memory
-				return p[1], p[2]			# return Page and page id
-		else:			# if invalid method, returns None (it should not occur)
-			return None
 	'''
 	Simply remove a page from memory by its index.
 	Returns the page removed.
 	'''
 	def remove_page(self, idx):
-		p = self.pagelist[idx]		# gets the page from list
-		self.pagelist[idx] = None	# sets its slot to None
-		self.allocated = self.allocated - 1			### updates memory allocated
-		self.mem_allocated = self.mem_allocated - p[1].stored
-		return p			# returns removed page
+		with self.lock:
+			t = self.table
+			p = t.get(idx)		# gets the page from the table
+			key = t.owner[idx] << PAGE_BITS | p[2]
+			t.clear(idx)		# sets its slot empty
+			heapq.heappush(self.free_frames, idx)	# slot is free again
+			if self.index.get(key) == idx:		### removes the page from the indexes
+				del self.index[key]
+			self.drop_frame(p[1].process, idx)
+			self.drop_partial(p[1].process, idx)
+			if self.policy is not None:
+				self.policy.on_remove(idx)
+			self.allocated = self.allocated - 1			### updates memory allocated
+			self.mem_allocated = self.mem_allocated - p[1].stored
+			return p			# returns removed page
+	'''
+	Removes and returns up to n pages chosen by the replacement policy, as a list of
+	(Page, page_id), with the same order they were chosen.
+	'''
+	def evict(self, n):
+		with self.lock:
+			pages = []
+			if self.policy is None:
+				return pages
+			for i in range(n):
+				idx = self.policy.victim()	# slot of the page to be removed
+				if idx is None:		# no pages left
+					break
+				self.last_removed = idx
+				p = self.remove_page(idx)
+				pages.append((p[1], p[2]))
+			return pages
 	'''
 	Removes and returns page by its name and page id.
 	'''
 	def get_page_by_address(self, process, page_id):
-		for i,p in enumerate(self.pagelist):		# for each page in list
-			if p is not None  and p[1].process == process and p[2] == page_id:
-				p = self.remove_page(i)		### if its the page we're looking for
-				return p[1], p[2]		### removes and returns
+		with self.lock:
+			i = self.find_page(process, page_id)	# slot of the page we're looking for
+			if i is None:
+				return None
+			p = self.remove_page(i)		### removes and returns
+			return p[1], p[2]
+	'''
+	Removes and returns the pages of process with the given page ids, as a list of
+	(Page, page_id). Page ids not stored are skipped.
+	'''
+	def take_pages(self, process, page_ids):
+		with self.lock:
+			pages = []
+			for page_id in page_ids:
+				page = self.get_page_by_address(process, page_id)
+				if page is not None:
+					pages.append(page)
+			return pages
+	'''
+	Removes the pages of process with page ids from first on, going through the slots
+	it owns (see frames). Returns the number of pages removed.
+	'''
+	def free_pages(self, process, first=0):
+		with self.lock:
+			page_id = self.table.page_id
+			slots = [i for i in self.frames.get(process, ()) if page_id[i] >= first]	# a copy, as removing changes the array
+			for i in slots:
+				self.remove_page(i)
+			return len(slots)
+	'''
+	Forgets a process that ended, releasing the id of its name (see frametable.py) when it
+	owns no page here.
+	'''
+	def forget_process(self, process):
+		with self.lock:
+			if process not in self.frames:
+				self.table.release(process)
+	'''
+	Gives back up to n bytes from the end of the page page_id of process, if it's stored here.
+	The bytes given back are zeroed in the store, and a page left with no bytes is removed.
+	Returns the number of bytes given back.
+	'''
+	def trim_page(self, process, page_id, n):
+		with self.lock:
+			i = self.find_page(process, page_id)
+			if i is None:
+				return 0
+			t = self.table
+			n = min(n, t.stored[i])
+			if n == t.stored[i]:			# nothing left in the page
+				self.remove_page(i)
+				return n
+			self.drop_partial(process, i)		# the page is kept by its new free bytes
+			t.stored[i] = t.stored[i] - n
+			t.free[i] = t.free[i] + n
+			self.add_partial(process, i)
+			self.mem_allocated = self.mem_allocated - n
+			if self.store is not None and n > 0:
+				self.store.page(i)[t.stored[i]:t.stored[i]+n] = bytes(n)
+			return n
+	'''
+	Stores many (Page, page_id) pairs at an execution time, returning the list of their indexes.
+	Stops at the first page that doesn't fit, so the list may be shorter.
+	'''
+	def store_pages(self, time, pages):
+		with self.lock:
+			result = []
+			for page, page_id in pages:
+				idx = self.store_page(time, page.process, page_id, page.stored)
+				if idx is None:
+					break
+				result.append(idx)
+			return result
+	'''
+	Returns the number of empty slots.
+	'''
+	def free_slots(self):
+		return self.n_pages - self.allocated
 	'''
 	Tries to access some page in memory, if the page isn't there, returns page fault.
 	'''
 	def access_address(self, process, time, page, pid):
-		p = self.pagelist[page]	# gets page by index
-		if p is None:		# if there are no page, it's page fault
-			return None
-		if p[1].process == process and p[2] == pid:	### if the page is the page we're looking for
-			self.pagelist[page] = (time, p[1], p[2])### update the execution time for last accessed 
-			return 1				### returns
-		else:			# otherwise, page fault
-			return None
+		with self.lock:
+			if self.table.holds(page, process, pid):	### if the page is the page we're looking for
+				self.table.time[page] = time		### update the execution time for last accessed 
+				if self.policy is not None:
+					self.policy.on_access(page)
+				return 1				### returns
+			else:			# otherwise (no page or another page), it's page fault
+				return None
 	'''
 	Prints Memory status on screen.
 	Lists its size and memory allocated in bytes, and the list of pages
@@ -167,10 +399,11 @@ class Memory:
 	'''
 	def print_status(self):
 		print('Size: {}. Allocated: {}'.format(self.size, self.mem_allocated))
+		t = self.table
 		result = []
-		for p in self.pagelist:				### loops through the page list getting only the
-			if p is not None:			### useful info for printing
-				result.append((p[1].process,p[2]))
+		for i in range(self.n_pages):			### loops through the table getting only the
+			if t.is_used(i):			### useful info for printing
+				result.append((t.name(t.owner[i]),t.page_id[i]))
 			else:
-				result.append(p)
+				result.append(None)
 		print(result)
@@ -0,0 +1,184 @@
+'''
+Offline LRU miss ratio curve of a trace.
+Instead of running the simulator once per RAM size, the trace is read once and the
+LRU stack distance of every page reference is computed: a reference at depth d is a
+hit for every RAM with at least d frames and a page fault for the smaller ones.
+The distances are counted with a Fenwick tree over the time of the last reference of
+each page, so each reference costs O(log n) with n the number of distinct pages.
+
+Pages are mapped as in Manager.access_memory (page_id = address//page_size):
+	C process size: references the pages of the new process (0 to size-1)
+	M process size: references the pages of the new addresses (old size to new size-1)
+	F process [size]: removes the pages past the new size from the stack (all of them
+		when the process terminates), as they leave the memories
+	A process address: references the page of the address, counted as a page fault
+		when it isn't in the top frames of the stack (or was never referenced)
+Accesses out of the size of the process (segmentation faults) are ignored.
+The curve is exact only for traces whose allocations (M and partial F) are multiples of
+the page size. Otherwise the simulator places the rest of an allocation in the page of the
+process in RAM with the best fit (see Memory.find_room). That page depends on what is in
+RAM, so its page ids, and the pages the accesses reach, no longer follow the addresses as
+above, and the curve is only an estimate.
+The curve has one line per RAM size in frames, with its size in bytes, the number of
+faults and the miss ratio (faults over accesses), written as CSV or JSON.
+
+Usage: python mrc.py trace [--format csv|json] [--max-frames N] [-o output]
+'''
+import argparse
+import json
+import sys
+from array import array
+import tracefile
+'''
+LRU stack of page keys, returning the depth of each reference.
+When the time counter reaches the capacity of the tree, the live pages are renumbered
+by their last reference (see compact), so memory depends only on the distinct pages.
+'''
+class StackDistance:
+	def __init__(self, capacity=1<<16):
+		self.capacity = capacity
+		self.tree = array('l', [0])*(capacity+1)	# Fenwick tree, 1 at the last reference of each page
+		self.last = {}		# page key -> time of its last reference
+		self.t = 0		# time of the last reference
+		self.pages = 0		# pages referenced, counting again the pages referenced after removal
+	def add(self, i, v):
+		tree = self.tree
+		n = self.capacity
+		while i <= n:
+			tree[i] = tree[i] + v
+			i = i + (i & -i)
+	def prefix(self, i):
+		tree = self.tree
+		s = 0
+		while i > 0:
+			s = s + tree[i]
+			i = i - (i & -i)
+		return s
+	'''
+	Renumbers the pages from 1 in order of last reference, growing the tree if needed.
+	'''
+	def compact(self):
+		keys = sorted(self.last, key=self.last.get)
+		self.capacity = max(self.capacity, 2*len(keys))
+		tree = array('l', [0])*(self.capacity+1)
+		for t, key in enumerate(keys, 1):
+			self.last[key] = t
+			tree[t] = 1
+		for i in range(1, self.capacity+1):	# linear Fenwick construction
+			j = i + (i & -i)
+			if j <= self.capacity:
+				tree[j] = tree[j] + tree[i]
+		self.tree = tree
+		self.t = len(keys)
+	'''
+	References a page, returning its stack depth (1 for the most recent page),
+	or a Nonetype object if it was never referenced.
+	'''
+	def reference(self, key):
+		if self.t == self.capacity:
+			self.compact()
+		self.t = self.t + 1
+		s = self.last.get(key)
+		if s is None:
+			depth = None
+			self.pages = self.pages + 1
+		else:
+			depth = len(self.last) - self.prefix(s) + 1	# pages referenced after s, plus itself
+			self.add(s, -1)
+		self.add(self.t, 1)
+		self.last[key] = self.t
+		return depth
+	'''
+	Removes a page from the stack, if it's there.
+	'''
+	def remove(self, key):
+		s = self.last.pop(key, None)
+		if s is not None:
+			self.add(s, -1)
+'''
+Reads the operations and returns (histogram, cold, accesses, pages):
+	histogram: number of accesses for each stack depth
+	cold: accesses to pages never referenced before
+	accesses: number of valid accesses
+	pages: number of distinct pages referenced (a page freed and referenced again counts twice)
+'''
+def stack_histogram(ops, page_size):
+	stack = StackDistance()
+	sizes = {}		# process name -> size in bytes
+	histogram = array('q')
+	cold = 0
+	accesses = 0
+	for op, process, num in ops:
+		if op == 'A':
+			size = sizes.get(process)
+			if size is None or num >= size:		# segmentation fault
+				continue
+			accesses = accesses + 1
+			d = stack.reference((process, num//page_size))
+			if d is None:
+				cold = cold + 1
+			else:
+				if d >= len(histogram):
+					histogram.extend([0]*(d+1-len(histogram)))
+				histogram[d] = histogram[d] + 1
+		elif op == 'C' or op == 'M':
+			if op == 'C':
+				old = 0
+			elif process in sizes:
+				old = sizes[process]
+			else:			# allocation for a process never created
+				continue
+			new = old + num
+			sizes[process] = new
+			if new > old:
+				for page_id in range((old+page_size-1)//page_size, (new+page_size-1)//page_size):
+					stack.reference((process, page_id))
+		elif op == 'F':
+			old = sizes.get(process)
+			if old is None:		# process never created
+				continue
+			if num == tracefile.TERMINATE or num >= old:
+				new = 0
+				del sizes[process]
+			else:
+				new = old - num
+				sizes[process] = new
+			for page_id in range((new+page_size-1)//page_size, (old+page_size-1)//page_size):
+				stack.remove((process, page_id))
+	return histogram, cold, accesses, stack.pages
+'''
+Returns the curve as a list of (frames, faults) for RAM sizes of 1 to max_frames frames.
+'''
+def miss_curve(histogram, cold, max_frames):
+	curve = []
+	faults = cold + sum(histogram)	# with no frames every access faults
+	for frames in range(1, max_frames+1):
+		if frames < len(histogram):
+			faults = faults - histogram[frames]	# depth frames is now a hit
+		curve.append((frames, faults))
+	return curve
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='One pass LRU miss ratio curve of a trace.')
+	parser.add_argument('trace', help='input trace, text or compiled')
+	parser.add_argument('--format', choices=['csv', 'json'], default='csv')
+	parser.add_argument('--max-frames', type=int, help='largest RAM size in frames (default: all pages)')
+	parser.add_argument('-o', '--output', help='output file (default: screen)')
+	args = parser.parse_args()
+	trace = tracefile.open_trace(args.trace)
+	page_size = trace.header.page_size
+	histogram, cold, accesses, pages = stack_histogram(trace.ops(), page_size)
+	trace.close()
+	curve = miss_curve(histogram, cold, args.max_frames or max(pages, 1))
+	out = open(args.output, 'w') if args.output else sys.stdout
+	if args.format == 'csv':
+		out.write('frames,ram_size,faults,miss_ratio\n')
+		for frames, faults in curve:
+			out.write('{},{},{},{:.6f}\n'.format(frames, frames*page_size, faults, faults/accesses if accesses else 0.0))
+	else:
+		json.dump({'page_size': page_size, 'accesses': accesses, 'pages': pages,
+			'curve': [{'frames': frames, 'ram_size': frames*page_size, 'faults': faults,
+				'miss_ratio': faults/accesses if accesses else 0.0} for frames, faults in curve]}, out, indent=1)
+		out.write('\n')
+	if out is not sys.stdout:
+		out.close()
@@ -4,16 +4,19 @@ This class is responsible only for allocating more memory after it's created.
 	process: name of the process owning this page
 	size: the size of the page in bytes
 	stored: how much of the page size is in use
+	frame: the slot the page was removed from, so its contents can follow it
 	
 Author: Pedro Braga Alves
 Date: Jun 27, 2017
 '''
 class Page:
-	def __init__(self, process, size, stored):
+	__slots__ = ('process', 'size', 'stored', 'free', 'frame')
+	def __init__(self, process, size, stored, frame=None):
 		self.process = process
 		self.size = size
 		self.stored = stored
 		self.free = size-stored	# bytes left to allocate
+		self.frame = frame
 	'''
 	Method for storing more bytes in the page.
 	Takes a size as argument and then tries to allocate it to the page.
@@ -0,0 +1,47 @@
+'''
+Stores for the contents of the pages of a Memory, one page_size block per slot.
+	MmapStore: the blocks live in a file mapped in memory (for the disc), so the
+		memory can be larger than the simulator process can hold
+	BufferStore: the blocks live in a bytearray (for the RAM)
+Both give the block of a slot as a memoryview (see page), so contents are copied
+between memories without intermediate bytes objects:
+	ram.store.page(i)[:] = disc.store.page(j)
+'''
+import mmap
+
+class BufferStore:
+	def __init__(self, n_pages, page_size):
+		self.page_size = page_size
+		self.buffer = bytearray(n_pages*page_size)
+		self.view = memoryview(self.buffer)
+	'''
+	Returns the block of slot idx.
+	'''
+	def page(self, idx):
+		start = idx*self.page_size
+		return self.view[start:start+self.page_size]
+	'''
+	Fills the block of slot idx with zeros.
+	'''
+	def clear(self, idx):
+		start = idx*self.page_size
+		self.view[start:start+self.page_size] = bytes(self.page_size)
+	def close(self):
+		self.view.release()
+
+class MmapStore(BufferStore):
+	'''
+	Creates (or truncates) the file at path with n_pages*page_size bytes and maps it.
+	'''
+	def __init__(self, path, n_pages, page_size):
+		self.page_size = page_size
+		self.path = path
+		size = max(1, n_pages*page_size)	# mmap can't map empty files
+		self.file = open(path, 'w+b')
+		self.file.truncate(size)
+		self.buffer = mmap.mmap(self.file.fileno(), size)
+		self.view = memoryview(self.buffer)
+	def close(self):
+		self.view.release()
+		self.buffer.close()
+		self.file.close()
@@ -0,0 +1,362 @@
+'''
+Page replacement policies used by the Memory to choose which page leaves when it's full.
+Each policy keeps its own bookkeeping of the slots in use, so the Memory doesn't have to
+scan its list of pages looking for a victim. The Memory notifies its policy when:
+	on_insert(idx, key): a page is stored at slot idx (key is (process, page_id))
+	on_access(idx): the page at slot idx is accessed or receives more memory
+	on_remove(idx): the page at slot idx leaves the memory
+	victim(): asks for the slot of the next page to be removed
+The victim method forgets the slot it returns, so the following on_remove is harmless.
+Before any of them, the Memory binds its FrameTable (see bind), so a policy can read the
+fields of its pages, such as the time of their last access.
+The bookkeeping of a policy can be saved and restored (see snapshot.py):
+	state(): returns it as a dictionary of numbers, lists and arrays
+	restore(state): replaces it by a state returned by state()
+Page keys are kept as arrays of owner ids and page ids, with the list of process names.
+
+Available policies (see POLICIES):
+	lru: Least Recently Used, linked list of slots in arrays with the oldest access first
+		(pages accessed at the same time are ordered by slot, the lowest first)
+	sequential: removes the first valid page next to the last index removed
+	fifo: First In First Out, ignores accesses
+	clock: second chance, a hand goes around the slots clearing reference bits
+	lfu: Least Frequently Used, frequency buckets ordered by insertion (ties are LRU)
+	arc: Adaptive Replacement Cache, balances recency and frequency using ghost lists
+'''
+from array import array
+from collections import OrderedDict
+'''
+Returns (names, owners, page_ids) for a list of (process, page_id) keys: the names are
+listed once, and owners are indexes in names.
+'''
+def pack_keys(keys, names=None):
+	names = names if names is not None else []
+	ids = dict((name, i) for i, name in enumerate(names))
+	owners, page_ids = array('i'), array('q')
+	for process, page_id in keys:
+		i = ids.get(process)
+		if i is None:
+			i = ids[process] = len(names)
+			names.append(process)
+		owners.append(i)
+		page_ids.append(page_id)
+	return names, owners, page_ids
+'''
+Returns the list of keys packed by pack_keys.
+'''
+def unpack_keys(names, owners, page_ids):
+	return [(names[i], page_id) for i, page_id in zip(owners, page_ids)]
+class ReplacementPolicy:
+	def __init__(self, n_pages):
+		self.n_pages = n_pages
+		self.table = None	# FrameTable of the Memory, see bind
+	def bind(self, table):
+		self.table = table
+	def on_insert(self, idx, key):
+		pass
+	def on_access(self, idx):
+		pass
+	def on_remove(self, idx):
+		pass
+	def victim(self):
+		return None
+	def state(self):
+		return {}
+	def restore(self, state):
+		pass
+'''
+Least Recently Used: slots are kept in a doubly linked list from the oldest to the newest
+access, in two arrays (prev and next) with a head at index n_pages, so it costs 8 bytes
+per slot; the most recent page is moved to the end, and the victim is the first one.
+Pages touched by the same operation share its time, and among them the lowest slot leaves
+first, as when the victim was the oldest page found scanning the slots in order: a page is
+placed after the pages with a lower time, or the same time and a lower slot (see place),
+which is the end of the list unless that operation touched higher slots before.
+'''
+class LRUPolicy(ReplacementPolicy):
+	def __init__(self, n_pages):
+		ReplacementPolicy.__init__(self, n_pages)
+		self.prev = array('i', [-1])*(n_pages+1)	# previous slot in the list, -1 if not in it
+		self.next = array('i', [-1])*(n_pages+1)	# next slot in the list
+		self.prev[n_pages] = self.next[n_pages] = n_pages	# empty list
+	def link(self, idx):			# puts idx at the end
+		head = self.n_pages
+		last = self.prev[head]
+		self.next[last] = idx
+		self.prev[idx] = last
+		self.next[idx] = head
+		self.prev[head] = idx
+	def place(self, idx):			# puts idx in order of time and slot, looking from the end
+		prev, nxt = self.prev, self.next
+		time = self.table.time
+		t = time[idx]
+		after = self.n_pages
+		before = prev[after]
+		while before != self.n_pages and (time[before] > t or (time[before] == t and before > idx)):
+			after = before
+			before = prev[before]
+		nxt[before] = idx
+		prev[idx] = before
+		nxt[idx] = after
+		prev[after] = idx
+	def unlink(self, idx):
+		before, after = self.prev[idx], self.next[idx]
+		self.next[before] = after
+		self.prev[after] = before
+		self.prev[idx] = -1
+	def on_insert(self, idx, key):
+		if self.prev[idx] != -1:
+			self.unlink(idx)
+		self.place(idx)
+	def on_access(self, idx):		# unlink and place, the usual case inlined as it runs on every hit
+		prev, nxt = self.prev, self.next
+		before = prev[idx]
+		head = self.n_pages
+		last = prev[head]
+		if before == -1 or last == idx:	# not in the list, or already the newest
+			return
+		after = nxt[idx]
+		nxt[before] = after
+		prev[after] = before
+		time = self.table.time
+		t = time[idx]
+		if time[last] < t or (time[last] == t and last < idx):	# goes to the end
+			nxt[last] = idx
+			prev[idx] = last
+			nxt[idx] = head
+			prev[head] = idx
+		else:
+			self.place(idx)
+	def on_remove(self, idx):
+		if self.prev[idx] != -1:
+			self.unlink(idx)
+	def victim(self):
+		idx = self.next[self.n_pages]
+		if idx == self.n_pages:
+			return None
+		self.unlink(idx)
+		return idx
+	def state(self):
+		order = array('q')
+		idx = self.next[self.n_pages]
+		while idx != self.n_pages:
+			order.append(idx)
+			idx = self.next[idx]
+		return {'order': order}
+	def restore(self, state):
+		n = self.n_pages
+		self.prev = array('i', [-1])*(n+1)
+		self.next = array('i', [-1])*(n+1)
+		self.prev[n] = self.next[n] = n
+		for idx in state['order']:
+			self.link(idx)
+'''
+First In First Out: same as LRU but accesses don't change the order, and pages always
+enter at the end.
+'''
+class FIFOPolicy(LRUPolicy):
+	def on_insert(self, idx, key):
+		if self.prev[idx] != -1:
+			self.unlink(idx)
+		self.link(idx)
+	def on_access(self, idx):
+		pass
+'''
+Sequential: walks through the slots starting next to the last index removed,
+taking the first valid page found.
+'''
+class SequentialPolicy(ReplacementPolicy):
+	def __init__(self, n_pages):
+		ReplacementPolicy.__init__(self, n_pages)
+		self.used = bytearray(n_pages)	# 1 for slots with a page stored
+		self.count = 0			# number of slots with a page stored
+		self.last_removed = -1		# index of the last page removed
+	def on_insert(self, idx, key):
+		if not self.used[idx]:
+			self.used[idx] = 1
+			self.count = self.count + 1
+	def on_remove(self, idx):
+		if self.used[idx]:
+			self.used[idx] = 0
+			self.count = self.count - 1
+	def victim(self):
+		if self.count == 0:
+			return None
+		n = self.last_removed
+		while True:
+			n = (n+1)%self.n_pages		# takes the next index
+			if self.used[n]:		# until it finds a valid page
+				break
+		self.last_removed = n
+		self.on_remove(n)
+		return n
+	def state(self):
+		return {'used': array('B', self.used), 'count': self.count, 'last_removed': self.last_removed}
+	def restore(self, state):
+		self.used = bytearray(state['used'])
+		self.count = state['count']
+		self.last_removed = state['last_removed']
+'''
+Clock (second chance): every access sets the reference bit of the slot. The hand skips
+referenced pages clearing their bits, and takes the first page not referenced.
+'''
+class ClockPolicy(SequentialPolicy):
+	def __init__(self, n_pages):
+		SequentialPolicy.__init__(self, n_pages)
+		self.referenced = bytearray(n_pages)	# reference bit of each slot
+		self.hand = 0
+	def on_insert(self, idx, key):
+		SequentialPolicy.on_insert(self, idx, key)
+		self.referenced[idx] = 1
+	def on_access(self, idx):
+		self.referenced[idx] = 1
+	def victim(self):
+		if self.count == 0:
+			return None
+		while True:
+			n = self.hand
+			self.hand = (n+1)%self.n_pages
+			if self.used[n]:
+				if self.referenced[n]:		# second chance
+					self.referenced[n] = 0
+				else:
+					break
+		self.on_remove(n)
+		return n
+	def state(self):
+		state = SequentialPolicy.state(self)
+		state['referenced'] = array('B', self.referenced)
+		state['hand'] = self.hand
+		return state
+	def restore(self, state):
+		SequentialPolicy.restore(self, state)
+		self.referenced = bytearray(state['referenced'])
+		self.hand = state['hand']
+'''
+Least Frequently Used: slots are grouped in buckets by access count. The victim is
+the oldest slot in the lowest frequency bucket.
+'''
+class LFUPolicy(ReplacementPolicy):
+	def __init__(self, n_pages):
+		ReplacementPolicy.__init__(self, n_pages)
+		self.freq = {}		# access count of each slot
+		self.buckets = {}	# access count -> ordered slots with that count
+		self.min_freq = 0
+	def on_insert(self, idx, key):
+		self.on_remove(idx)
+		self.freq[idx] = 1
+		self.buckets.setdefault(1, OrderedDict())[idx] = None
+		self.min_freq = 1
+	def on_access(self, idx):
+		f = self.freq.get(idx)
+		if f is None:
+			return
+		del self.buckets[f][idx]
+		self.freq[idx] = f+1
+		self.buckets.setdefault(f+1, OrderedDict())[idx] = None
+		if f == self.min_freq and not self.buckets[f]:
+			self.min_freq = f+1
+	def on_remove(self, idx):
+		f = self.freq.pop(idx, None)
+		if f is not None:
+			del self.buckets[f][idx]
+	def victim(self):
+		if not self.freq:
+			return None
+		while not self.buckets.get(self.min_freq):	# removals may leave the lowest bucket empty
+			self.min_freq = self.min_freq + 1
+		idx = self.buckets[self.min_freq].popitem(last=False)[0]
+		del self.freq[idx]
+		return idx
+	def state(self):
+		slots, counts = array('q'), array('q')	# slots bucket by bucket, in order
+		for f, bucket in self.buckets.items():
+			slots.extend(bucket)
+			counts.extend([f]*len(bucket))
+		return {'slots': slots, 'counts': counts, 'min_freq': self.min_freq}
+	def restore(self, state):
+		self.freq = {}
+		self.buckets = {}
+		for idx, f in zip(state['slots'], state['counts']):
+			self.freq[idx] = f
+			self.buckets.setdefault(f, OrderedDict())[idx] = None
+		self.min_freq = state['min_freq']
+'''
+Adaptive Replacement Cache: T1 holds pages seen once recently and T2 pages seen at least twice.
+B1 and B2 remember the keys of pages removed from T1 and T2; a page coming back while in B1
+(or B2) makes the target size p of T1 grow (or shrink).
+'''
+class ARCPolicy(ReplacementPolicy):
+	def __init__(self, n_pages):
+		ReplacementPolicy.__init__(self, n_pages)
+		self.t1 = OrderedDict()		# slot -> key, pages accessed once
+		self.t2 = OrderedDict()		# slot -> key, pages accessed more than once
+		self.b1 = OrderedDict()		# ghost keys removed from t1
+		self.b2 = OrderedDict()		# ghost keys removed from t2
+		self.p = 0			# target size of t1
+	def on_insert(self, idx, key):
+		self.on_remove(idx)
+		if key in self.b1:		# recency was evicted too early
+			self.p = min(self.n_pages, self.p + max(1, len(self.b2)//max(1, len(self.b1))))
+			del self.b1[key]
+			self.t2[idx] = key
+		elif key in self.b2:		# frequency was evicted too early
+			self.p = max(0, self.p - max(1, len(self.b1)//max(1, len(self.b2))))
+			del self.b2[key]
+			self.t2[idx] = key
+		else:
+			self.t1[idx] = key
+	def on_access(self, idx):
+		if idx in self.t1:
+			self.t2[idx] = self.t1.pop(idx)
+		elif idx in self.t2:
+			self.t2.move_to_end(idx)
+	def on_remove(self, idx):
+		if self.t1.pop(idx, None) is None:
+			self.t2.pop(idx, None)
+	def victim(self):
+		if self.t1 and (len(self.t1) > self.p or not self.t2):
+			idx, key = self.t1.popitem(last=False)
+			ghost = self.b1
+		elif self.t2:
+			idx, key = self.t2.popitem(last=False)
+			ghost = self.b2
+		else:
+			return None
+		ghost[key] = None
+		if len(ghost) > self.n_pages:	# ghost lists remember at most one memory of keys
+			ghost.popitem(last=False)
+		return idx
+	def state(self):
+		state = {'p': self.p, 'names': []}
+		for name in ('t1', 't2', 'b1', 'b2'):
+			lst = getattr(self, name)
+			keys = lst.values() if name[0] == 't' else lst.keys()
+			names, state[name+'_owners'], state[name+'_pages'] = pack_keys(keys, state['names'])
+			if name[0] == 't':
+				state[name+'_slots'] = array('q', lst)
+		return state
+	def restore(self, state):
+		self.p = state['p']
+		for name in ('t1', 't2', 'b1', 'b2'):
+			keys = unpack_keys(state['names'], state[name+'_owners'], state[name+'_pages'])
+			if name[0] == 't':
+				setattr(self, name, OrderedDict(zip(state[name+'_slots'], keys)))
+			else:
+				setattr(self, name, OrderedDict.fromkeys(keys))
+
+POLICIES = {
+	'lru': LRUPolicy,
+	'sequential': SequentialPolicy,
+	'fifo': FIFOPolicy,
+	'clock': ClockPolicy,
+	'lfu': LFUPolicy,
+	'arc': ARCPolicy,
+}
+'''
+Returns a new policy object for the method name, or a Nonetype object if it doesn't exist.
+'''
+def get_policy(method, n_pages):
+	if method not in POLICIES:
+		return None
+	return POLICIES[method](n_pages)
@@ -5,15 +5,23 @@ Maintains a page table that stores the indexes of its pages in memory.
 	Ex: pagetable[1]==0 means that the page 1 from 
 	this process is at position 0 in memory
 The object deals with pages and memory allocated to it.
+The page and stride of its last page fault are kept to detect sequential or strided
+accesses (see Manager prefetch).
+Its lock guards the page table, so threads of different processes don't wait for each other.
 
 Author: Pedro Braga Alves
 Date: Jun 27, 2017
 '''
+import threading
 class Process:
+	__slots__ = ('name', 'size', 'pagetable', 'lock', 'last_fault', 'stride')
 	def __init__(self, name, size):
 		self.name = name
 		self.size = size
 		self.pagetable = []	# initialize page table
+		self.lock = threading.RLock()
+		self.last_fault = None	# page id of the last page fault
+		self.stride = 0		# page ids between the last two page faults
 	'''
 	Method for storing new page indexes
 	'''
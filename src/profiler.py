@@ -0,0 +1,152 @@
+'''
+Counts and latency histograms of the Manager operations and of their inner phases.
+Operations are the trace ones (C, A, M and F); the phases are:
+	lookup: looking for an accessed page in RAM (Memory.access_address)
+	allocation: storing the pages of a creation or allocation (Memory.allocate_page)
+	victim: choosing a page to leave RAM (the victim method of the policy)
+	swap_out: moving pages from RAM to disc (Manager.swap_out)
+	swap_in: bringing pages back from disc (Manager.swap_in)
+	scan: walking the pages of a process for room to allocate (Memory.find_room)
+Phases run inside operations and some inside other phases (a swap_out inside a
+swap_in), so their times overlap.
+The profiler replaces those methods of the bound objects by timed ones (see bind), so
+nothing is added to the simulator when there is no profiler. Bind it once the Manager
+is ready (after a snapshot is loaded, as that replaces the policy).
+Latencies go to histograms with power of two buckets in nanoseconds. The report is JSON
+or Prometheus text (see report), written at the end of a run and, optionally, every
+`every` operations.
+'''
+import json
+import sys
+import threading
+import time as tm
+
+OPERATIONS = ('C', 'A', 'M', 'F')
+PHASES = ('lookup', 'allocation', 'victim', 'swap_out', 'swap_in', 'scan')
+FORMATS = ('json', 'prometheus')
+'''
+Latency histogram: bucket b counts the latencies below 2**b nanoseconds (and not below 2**(b-1)).
+'''
+class Histogram:
+	def __init__(self):
+		self.buckets = [0]*64
+		self.count = 0
+		self.total = 0		# sum of latencies in nanoseconds
+		self.max = 0
+	def add(self, ns):
+		self.buckets[ns.bit_length()] += 1
+		self.count = self.count + 1
+		self.total = self.total + ns
+		if ns > self.max:
+			self.max = ns
+	'''
+	Returns the histogram as a dictionary, with the upper bound (in nanoseconds) of each bucket used.
+	'''
+	def as_dict(self):
+		return {'count': self.count, 'seconds': self.total/1e9,
+			'mean_ns': self.total/self.count if self.count else 0, 'max_ns': self.max,
+			'buckets': dict((str(2**b), n) for b, n in enumerate(self.buckets) if n)}
+
+class Profiler:
+	def __init__(self, format='json', out=None, every=0):
+		if format not in FORMATS:
+			raise ValueError('unknown profile format {}'.format(format))
+		self.format = format
+		self.out = out if out is not None else sys.stdout
+		self.every = every		# operations between interval reports, 0 for none
+		self.ops = 0			# operations timed so far
+		self.operations = dict((op, Histogram()) for op in OPERATIONS)
+		self.phases = dict((phase, Histogram()) for phase in PHASES)
+		self.lock = threading.Lock()	# the Manager may be called from many threads
+	'''
+	Returns fn timed into histogram hist.
+	'''
+	def timed(self, hist, fn):
+		clock = tm.perf_counter_ns
+		lock = self.lock
+		def call(*args, **kwargs):
+			t0 = clock()
+			try:
+				return fn(*args, **kwargs)
+			finally:
+				ns = clock() - t0
+				with lock:
+					hist.add(ns)
+		return call
+	'''
+	Returns the operation fn timed into the histogram of op, reporting every `every` operations.
+	'''
+	def timed_operation(self, op, fn):
+		clock = tm.perf_counter_ns
+		hist = self.operations[op]
+		def call(*args, **kwargs):
+			t0 = clock()
+			try:
+				return fn(*args, **kwargs)
+			finally:
+				ns = clock() - t0
+				with self.lock:
+					hist.add(ns)
+					self.ops = self.ops + 1
+					due = self.every and self.ops%self.every == 0
+				if due:
+					self.dump()
+		return call
+	'''
+	Times the operations and phases of a Manager and its memories.
+	'''
+	def bind(self, mngr):
+		mngr.create_process = self.timed_operation('C', mngr.create_process)
+		mngr.access_memory = self.timed_operation('A', mngr.access_memory)
+		mngr.allocate_memory = self.timed_operation('M', mngr.allocate_memory)
+		mngr.free_process = self.timed_operation('F', mngr.free_process)
+		mngr.swap_out = self.timed(self.phases['swap_out'], mngr.swap_out)
+		mngr.swap_in = self.timed(self.phases['swap_in'], mngr.swap_in)
+		ram = mngr.ram
+		ram.access_address = self.timed(self.phases['lookup'], ram.access_address)
+		ram.allocate_page = self.timed(self.phases['allocation'], ram.allocate_page)
+		ram.find_room = self.timed(self.phases['scan'], ram.find_room)
+		if ram.policy is not None:
+			ram.policy.victim = self.timed(self.phases['victim'], ram.policy.victim)
+	'''
+	Returns the report as a dictionary.
+	'''
+	def as_dict(self):
+		with self.lock:
+			return {'ops': self.ops,
+				'operations': dict((op, h.as_dict()) for op, h in self.operations.items()),
+				'phases': dict((phase, h.as_dict()) for phase, h in self.phases.items())}
+	'''
+	Returns the histograms in the Prometheus text format, in seconds.
+	'''
+	def prometheus(self):
+		with self.lock:
+			lines = ['# ops {}'.format(self.ops)]
+			for metric, label, hists, text in (
+					('vmm_operation_seconds', 'op', self.operations, 'Latency of the Manager operations.'),
+					('vmm_phase_seconds', 'phase', self.phases, 'Latency of the phases inside the operations.')):
+				lines.append('# HELP {} {}'.format(metric, text))
+				lines.append('# TYPE {} histogram'.format(metric))
+				for name, h in hists.items():
+					used = [b for b, n in enumerate(h.buckets) if n] or [0, -1]
+					total = 0
+					for b in range(used[0], used[-1]+1):	# cumulative counts
+						total = total + h.buckets[b]
+						lines.append('{}_bucket{{{}="{}",le="{}"}} {}'.format(metric, label, name, 2**b/1e9, total))
+					lines.append('{}_bucket{{{}="{}",le="+Inf"}} {}'.format(metric, label, name, h.count))
+					lines.append('{}_sum{{{}="{}"}} {}'.format(metric, label, name, h.total/1e9))
+					lines.append('{}_count{{{}="{}"}} {}'.format(metric, label, name, h.count))
+		return '\n'.join(lines) + '\n'
+	'''
+	Returns the report in the format of the profiler.
+	'''
+	def report(self):
+		if self.format == 'prometheus':
+			return self.prometheus()
+		return json.dumps(self.as_dict()) + '\n'
+	'''
+	Writes the report to the output of the profiler.
+	'''
+	def dump(self):
+		self.out.write(self.report())
+		self.out.flush()
@@ -0,0 +1,169 @@
+'''
+Discrete event scheduler and random workloads for the Random mode.
+The Scheduler keeps a heap of events ordered by virtual time, and runs each one with the
+clock set to its time, so the simulation doesn't wait for threads or sleep.
+The RandomWorkload schedules process arrivals, memory accesses and allocation bursts,
+with every random choice taken from a generator seeded by the user, so a run with the
+same seed is always the same.
+
+Access patterns (see PATTERNS), each one created per process:
+	uniform: any address of the process
+	sequential: walks the address space of the process by stride bytes
+	zipf: page ranks follow a Zipf distribution with exponent s (page 0 is the most used)
+	working_set: a few random pages, replaced by new ones every period accesses
+
+Process arrivals (see ARRIVALS), with a mean of arrival ticks between them:
+	fixed: every arrival ticks
+	exponential: exponential times between arrivals (a Poisson process), rounded to at least a tick
+'''
+import heapq
+import random
+from bisect import bisect_left
+'''
+Events are (time, sequence, function, arguments), the sequence keeps the order of
+events scheduled to the same time.
+'''
+class Scheduler:
+	def __init__(self):
+		self.clock = 0		# virtual time
+		self.queue = []		# heap of events
+		self.seq = 0
+	'''
+	Schedules fn(*args) to run at a virtual time.
+	'''
+	def at(self, time, fn, *args):
+		heapq.heappush(self.queue, (time, self.seq, fn, args))
+		self.seq = self.seq + 1
+	'''
+	Schedules fn(*args) to run delay ticks after the current time.
+	'''
+	def after(self, delay, fn, *args):
+		self.at(self.clock + delay, fn, *args)
+	'''
+	Runs the events up to the time until, returning how many events ran.
+	'''
+	def run(self, until):
+		n = 0
+		queue = self.queue
+		while queue and queue[0][0] <= until:
+			time, seq, fn, args = heapq.heappop(queue)
+			self.clock = time
+			fn(*args)
+			n = n + 1
+		return n
+
+class UniformPattern:
+	def __init__(self, rng, page_size):
+		self.rng = rng
+	def next(self, size):
+		return self.rng.randrange(size)
+
+class SequentialPattern:
+	def __init__(self, rng, page_size, stride=None):
+		self.stride = stride if stride is not None else page_size
+		self.cursor = 0
+	def next(self, size):
+		address = self.cursor%size
+		self.cursor = address + self.stride
+		return address
+
+class ZipfPattern:
+	def __init__(self, rng, page_size, s=1.0):
+		self.rng = rng
+		self.page_size = page_size
+		self.s = s
+		self.cumulative = []	# cumulative weights of page ranks, grown as processes grow
+	def next(self, size):
+		n = (size+self.page_size-1)//self.page_size
+		cum = self.cumulative
+		while len(cum) < n:
+			cum.append((cum[-1] if cum else 0.0) + 1.0/(len(cum)+1)**self.s)
+		page = bisect_left(cum, self.rng.random()*cum[n-1], 0, n-1)
+		return min(page*self.page_size + self.rng.randrange(self.page_size), size-1)
+
+class WorkingSetPattern:
+	def __init__(self, rng, page_size, pages=4, period=50):
+		self.rng = rng
+		self.page_size = page_size
+		self.pages = pages
+		self.period = period
+		self.count = 0
+		self.working_set = []
+	def next(self, size):
+		n = (size+self.page_size-1)//self.page_size
+		if self.count%self.period == 0 or not self.working_set:	# new working set
+			self.working_set = [self.rng.randrange(n) for i in range(self.pages)]
+		self.count = self.count + 1
+		page = self.rng.choice(self.working_set)%n
+		return min(page*self.page_size + self.rng.randrange(self.page_size), size-1)
+
+PATTERNS = {
+	'uniform': UniformPattern,
+	'sequential': SequentialPattern,
+	'zipf': ZipfPattern,
+	'working_set': WorkingSetPattern,
+}
+'''
+Returns the ticks to the next arrival, for a mean of mean ticks.
+'''
+def fixed_arrival(rng, mean):
+	return mean
+def exponential_arrival(rng, mean):
+	return max(1, int(round(rng.expovariate(1.0/mean))))
+
+ARRIVALS = {
+	'fixed': fixed_arrival,
+	'exponential': exponential_arrival,
+}
+'''
+Random workload on a Manager:
+	a new process arrives every arrival ticks on average (spaced as given by arrivals, see
+	ARRIVALS), with a random size up to max_size
+	each process accesses one address per tick, following its access pattern
+	every alloc_every accesses it allocates up to max_size bytes, and with probability
+	burst_prob this is a burst of up to burst_max allocations in the same tick
+'''
+class RandomWorkload:
+	def __init__(self, mngr, sched, seed=0, pattern='uniform', arrival=6, max_size=None,
+			alloc_every=10, burst_prob=0.0, burst_max=4, arrivals='fixed'):
+		self.mngr = mngr
+		self.sched = sched
+		self.rng = random.Random(seed)
+		self.pattern = PATTERNS[pattern]
+		self.arrival = arrival
+		self.next_arrival = ARRIVALS[arrivals]
+		self.max_size = max_size if max_size is not None else max(1, mngr.ram.size//2)
+		self.alloc_every = alloc_every
+		self.burst_prob = burst_prob
+		self.burst_max = burst_max
+		self.arrivals = 0
+	'''
+	Schedules the first arrival at the current time.
+	'''
+	def start(self):
+		self.sched.after(0, self.on_arrival)
+	'''
+	Tries to create a new process, and schedules its accesses and the next arrival.
+	'''
+	def on_arrival(self):
+		name = 'p'+str(self.arrivals)		# process name based on the number of arrivals
+		self.arrivals = self.arrivals + 1
+		size = self.rng.randint(1, self.max_size)
+		if self.mngr.create_process(name, size, self.sched.clock):
+			pattern = self.pattern(random.Random(self.rng.getrandbits(64)), self.mngr.page_size)
+			self.sched.after(1, self.on_access, name, pattern, 1)
+		self.sched.after(self.next_arrival(self.rng, self.arrival), self.on_arrival)
+	'''
+	Accesses one address of a process, allocating memory every alloc_every accesses.
+	'''
+	def on_access(self, name, pattern, n):
+		time = self.sched.clock
+		p = self.mngr.process_list[name]
+		self.mngr.access_memory(name, pattern.next(p.size), time)
+		if n%self.alloc_every == 0:
+			burst = 1
+			if self.rng.random() < self.burst_prob:
+				burst = self.rng.randint(2, self.burst_max)
+			for i in range(burst):
+				self.mngr.allocate_memory(name, self.rng.randint(1, self.max_size), time)
+		self.sched.after(1, self.on_access, name, pattern, n+1)
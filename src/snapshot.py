@@ -0,0 +1,130 @@
+'''
+Snapshots of the simulator state, so a replay can be stopped and resumed later.
+A snapshot keeps the Manager, both Memories and the page tables of all processes,
+together with the trace offset and time to resume from. The file has:
+	head (HEAD): magic, version and the length of the metadata
+	metadata: JSON with the settings and counters of the Manager and Memories,
+		the process names, sizes and page table lengths, and the byte order of the arrays
+	arrays: for each Memory (RAM, then disc), its heap of free slots, the five columns
+		of its FrameTable (see frametable.py) and the arrays of the state of its replacement
+		policy (see policy.py); then all the page tables, one after another
+The arrays are written and read in bulk (array.tofile and array.fromfile), so loading a
+memory with millions of slots doesn't build one object per page.
+The replacement policies save their bookkeeping too (order, hand, reference bits, counts,
+ghost lists), so a resumed run chooses the same victims as an uninterrupted one.
+The contents of the pages (see pagestore.py) are not kept.
+'''
+import json
+import struct
+import sys
+from array import array
+from process import Process
+
+MAGIC = b'MMSN'
+VERSION = 2
+HEAD = struct.Struct('<4sHI')
+COLUMNS = ('owner', 'page_id', 'time', 'stored', 'free')	# FrameTable arrays, in file order
+'''
+Returns the metadata and the arrays of a Memory.
+'''
+def memory_state(memory):
+	t = memory.table
+	meta = {'page_size': memory.page_size, 'n_pages': memory.n_pages, 'allocated': memory.allocated,
+		'mem_allocated': memory.mem_allocated, 'last_removed': memory.last_removed,
+		'high_water': memory.high_water, 'free_frames': len(memory.free_frames), 'names': t.names}
+	arrays = [array('q', memory.free_frames)] + [getattr(t, c) for c in COLUMNS]
+	state = memory.policy.state() if memory.policy is not None else {}
+	meta['policy'] = {'values': {}, 'arrays': []}	# arrays are listed as [name, typecode, length]
+	for name, value in sorted(state.items()):
+		if isinstance(value, array):
+			meta['policy']['arrays'].append([name, value.typecode, len(value)])
+			arrays.append(value)
+		else:
+			meta['policy']['values'][name] = value
+	return meta, arrays
+'''
+Saves the state of a Manager to path, with the offset of the next trace operation
+and the time of execution to resume from.
+'''
+def save_snapshot(path, mngr, offset, time):
+	with mngr.list_lock, mngr.frame_lock, mngr.ram.lock, mngr.disc.lock:
+		memories = [memory_state(m) for m in (mngr.ram, mngr.disc)]
+		processes = list(mngr.process_list.values())
+		meta = {'byteorder': sys.byteorder, 'offset': offset, 'time': time,
+			'switch_method': mngr.switch_method, 'page_size': mngr.page_size,
+			'bytes_out': mngr.bytes_out, 'bytes_in': mngr.bytes_in,
+			'prefetched': sorted(mngr.prefetched),
+			'memories': [m for m, arrays in memories],
+			'processes': [[p.name, p.size, p.last_fault, p.stride, len(p.pagetable)] for p in processes]}
+		data = json.dumps(meta).encode()
+		with open(path, 'wb') as f:
+			f.write(HEAD.pack(MAGIC, VERSION, len(data)))
+			f.write(data)
+			for m, arrays in memories:
+				for a in arrays:
+					a.tofile(f)
+			for p in processes:
+				array('q', p.pagetable).tofile(f)
+'''
+Reads n items of type typecode from an open file, fixing the byte order if needed.
+'''
+def read_array(f, typecode, n, swap):
+	a = array(typecode)
+	a.fromfile(f, n)
+	if swap:
+		a.byteswap()
+	return a
+'''
+Restores the Memory state read from an open file.
+'''
+def load_memory(f, memory, meta, swap):
+	if meta['page_size'] != memory.page_size or meta['n_pages'] != memory.n_pages:
+		raise ValueError('snapshot memory has {} pages of {} bytes, not {} of {}'.format(
+			meta['n_pages'], meta['page_size'], memory.n_pages, memory.page_size))
+	with memory.lock:
+		memory.allocated = meta['allocated']
+		memory.mem_allocated = meta['mem_allocated']
+		memory.last_removed = meta['last_removed']
+		memory.high_water = meta['high_water']
+		memory.free_frames = list(read_array(f, 'q', meta['free_frames'], swap))
+		t = memory.table
+		for c in COLUMNS:
+			setattr(t, c, read_array(f, getattr(t, c).typecode, memory.n_pages, swap))
+		t.reload_names(meta['names'])
+		memory.reindex()
+		state = dict(meta['policy']['values'])
+		for name, typecode, n in meta['policy']['arrays']:
+			state[name] = read_array(f, typecode, n, swap)
+		if memory.policy is not None:
+			policy = type(memory.policy)(memory.n_pages)
+			policy.bind(t)
+			policy.restore(state)
+			memory.policy = policy
+'''
+Restores the state saved in path into a Manager built with the same memory sizes,
+page size and switch method (usually from the header of the same trace).
+Returns the offset of the next trace operation and the time to resume from.
+'''
+def load_snapshot(path, mngr):
+	with open(path, 'rb') as f:
+		magic, version, length = HEAD.unpack(f.read(HEAD.size))
+		if magic != MAGIC or version != VERSION:
+			raise ValueError('{} is not a snapshot (version {})'.format(path, VERSION))
+		meta = json.loads(f.read(length).decode())
+		if meta['switch_method'] != mngr.switch_method or meta['page_size'] != mngr.page_size:
+			raise ValueError('snapshot uses {} with pages of {} bytes'.format(meta['switch_method'], meta['page_size']))
+		swap = meta['byteorder'] != sys.byteorder
+		with mngr.list_lock, mngr.frame_lock:
+			for memory, m in zip((mngr.ram, mngr.disc), meta['memories']):
+				load_memory(f, memory, m, swap)
+			mngr.process_list = {}
+			for name, size, last_fault, stride, n in meta['processes']:
+				p = Process(name, size)
+				p.last_fault = last_fault
+				p.stride = stride
+				p.pagetable = read_array(f, 'q', n, swap).tolist()
+				mngr.process_list[name] = p
+			mngr.bytes_out = meta['bytes_out']
+			mngr.bytes_in = meta['bytes_in']
+			mngr.prefetched = set((process, pid) for process, pid in meta['prefetched'])
+	return meta['offset'], meta['time']
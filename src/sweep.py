@@ -0,0 +1,114 @@
+'''
+Parameter sweep of a trace over page sizes, RAM sizes, disc sizes and switch methods.
+The trace is read once into compact arrays, which are handed to each worker of a
+process pool when it starts. Every combination of the grid then runs in its own
+Manager and Memory objects, counting events instead of printing them (see events.py),
+and the counts are gathered in a single table written as CSV.
+Hits are the accesses that found their page in RAM at once (AccessHit events), and page
+faults are split by cause, accesses or allocations (see FaultCounterSink).
+Parameters not given in the command line are taken from the trace header.
+
+Usage: python sweep.py trace [--page-size N ...] [--ram-size N ...] [--disc-size N ...]
+	[--policy NAME ...] [--workers N] [-o output]
+'''
+import argparse
+import itertools
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from memory import Memory
+from manager import Manager
+from policy import POLICIES
+from events import CounterSink, PageFault
+import tracefile
+
+COLUMNS = ('page_size', 'ram_size', 'disc_size', 'policy', 'ops', 'hits', 'access_faults',
+	'alloc_faults', 'evictions', 'oom', 'segfaults', 'error')
+'''
+Trace kept as arrays: op characters, process ids and numbers, plus the process names.
+'''
+class PackedTrace:
+	def __init__(self, ops):
+		self.op = bytearray()
+		self.pid = array('I')
+		self.num = array('q')
+		self.names = []
+		ids = {}
+		for op, process, num in ops:
+			i = ids.get(process)
+			if i is None:
+				i = ids[process] = len(self.names)
+				self.names.append(process)
+			self.op.append(ord(op))
+			self.pid.append(i)
+			self.num.append(num)
+	def __len__(self):
+		return len(self.op)
+	def ops(self):
+		names = self.names
+		for op, pid, num in zip(self.op, self.pid, self.num):
+			yield chr(op), names[pid], num
+
+'''
+Counts events by type name, plus page faults by cause (as 'AccessFault' and 'AllocationFault').
+'''
+class FaultCounterSink(CounterSink):
+	def emit(self, event):
+		CounterSink.emit(self, event)
+		if type(event) is PageFault:
+			if event.address is None:
+				self.counts['AllocationFault'] += 1
+			else:
+				self.counts['AccessFault'] += 1
+
+shared = None	# trace of the worker process, see init_worker
+def init_worker(trace):
+	global shared
+	shared = trace
+'''
+Runs the shared trace with one combination of parameters and returns its table row.
+'''
+def run_config(config):
+	page_size, ram_size, disc_size, policy = config
+	sink = FaultCounterSink()
+	ram = Memory(page_size, ram_size//page_size)
+	disc = Memory(page_size, disc_size//page_size)
+	mngr = Manager(ram, disc, policy, page_size, sink)
+	error = ''
+	try:
+		tracefile.replay(mngr, shared.ops())
+	except Exception as e:	# the run stops, but the other combinations go on
+		error = '{}: {}'.format(type(e).__name__, e)
+	c = sink.counts
+	return (page_size, ram_size, disc_size, policy, len(shared), c['AccessHit'], c['AccessFault'],
+		c['AllocationFault'], c['Eviction'], c['OutOfMemory'], c['Segfault'], error)
+'''
+Runs every combination of the grid in a pool of workers, returning the rows in grid order.
+'''
+def sweep(trace, page_sizes, ram_sizes, disc_sizes, policies, workers=None):
+	grid = list(itertools.product(page_sizes, ram_sizes, disc_sizes, policies))
+	with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(trace,)) as pool:
+		return list(pool.map(run_config, grid))
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Runs a trace over a grid of simulator parameters.')
+	parser.add_argument('trace', help='input trace, text or compiled')
+	parser.add_argument('--page-size', type=int, nargs='+', help='page sizes in bytes')
+	parser.add_argument('--ram-size', type=int, nargs='+', help='RAM sizes in bytes')
+	parser.add_argument('--disc-size', type=int, nargs='+', help='disc sizes in bytes')
+	parser.add_argument('--policy', nargs='+', choices=sorted(POLICIES), help='switch methods')
+	parser.add_argument('--workers', type=int, help='number of worker processes (default: all cores)')
+	parser.add_argument('-o', '--output', help='output CSV file (default: screen)')
+	args = parser.parse_args()
+	t = tracefile.open_trace(args.trace)
+	header = t.header
+	trace = PackedTrace(t.ops())		# the trace is read only once
+	t.close()
+	rows = sweep(trace, args.page_size or [header.page_size], args.ram_size or [header.ram_size],
+		args.disc_size or [header.disc_size], args.policy or [header.switch_method], args.workers)
+	out = open(args.output, 'w') if args.output else sys.stdout
+	out.write(','.join(COLUMNS) + '\n')
+	for row in rows:
+		out.write(','.join(str(v) for v in row) + '\n')
+	if out is not sys.stdout:
+		out.close()
@@ -0,0 +1,184 @@
+'''
+Reading, compiling and replaying input traces.
+A text trace has a header followed by one operation per line (see main.py):
+	mode			0 for sequential, 1 for random
+	switch method		replacement policy name, see policy.py
+	page size		in bytes
+	ram size		in bytes
+	disc size		in bytes
+	op process num		C | A | M | F, process name and size | address | size | size
+F frees size bytes of the process, or terminates it when the size is left out; such
+operations are read (and compiled) with num = TERMINATE.
+
+The compiled (binary) format keeps the same information packed, little endian:
+	header (HEADER): magic, version, mode, switch method, page size, ram size, disc size,
+		offset and number of operations, offset and number of process names
+	operations (RECORD): op character, process id and number, RECORD.size bytes each
+	names: for each process id, its length (2 bytes) followed by the utf-8 name
+The names come after the operations so a text trace can be compiled in a single pass.
+A compiled trace is replayed through mmap in chunks of CHUNK_OPS operations, so the memory
+used doesn't depend on the length of the trace.
+'''
+import mmap
+import struct
+from collections import namedtuple
+from events import InvalidOperation
+
+MAGIC = b'MMTR'
+VERSION = 1
+HEADER = struct.Struct('<4sHB16sIqqQQQQ')
+RECORD = struct.Struct('<cIq')
+NAME_LEN = struct.Struct('<H')
+CHUNK_OPS = 65536	# operations decoded at a time when replaying
+TERMINATE = -1		# num of F operations without a size
+
+Header = namedtuple('Header', 'mode switch_method page_size ram_size disc_size')
+'''
+Reads the five header lines of a text trace from an open file.
+'''
+def read_text_header(f):
+	mode = int(f.readline())
+	switch_method = f.readline().strip()
+	page_size = int(f.readline())
+	ram_size = int(f.readline())
+	disc_size = int(f.readline())
+	return Header(mode, switch_method, page_size, ram_size, disc_size)
+'''
+Yields (op, process, num) for each operation line left in an open text trace.
+'''
+def iter_text_ops(f):
+	for line in f:
+		ops = line.split()
+		if not ops:		# skips blank lines
+			continue
+		if len(ops) == 2 and ops[0] == 'F':	# terminates the process
+			yield ops[0], ops[1], TERMINATE
+		elif len(ops) == 3:
+			yield ops[0], ops[1], int(ops[2])
+		else:
+			raise ValueError('invalid operation: {}'.format(line.strip()))
+'''
+Text trace, read line by line.
+'''
+class TextTrace:
+	def __init__(self, path):
+		self.file = open(path, 'r')
+		self.header = read_text_header(self.file)
+		self.start = self.file.tell()
+	'''
+	Yields the operations from the index start on.
+	'''
+	def ops(self, start=0):
+		self.file.seek(self.start)
+		for i, op in enumerate(iter_text_ops(self.file)):
+			if i >= start:
+				yield op
+	def close(self):
+		self.file.close()
+'''
+Compiled trace, mapped in memory and decoded in chunks.
+'''
+class BinaryTrace:
+	def __init__(self, path):
+		self.file = open(path, 'rb')
+		self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		(magic, version, mode, method, page_size, ram_size, disc_size,
+			self.ops_offset, self.n_ops, names_offset, n_names) = HEADER.unpack_from(self.map, 0)
+		if magic != MAGIC or version != VERSION:
+			self.close()
+			raise ValueError('{} is not a compiled trace'.format(path))
+		self.header = Header(mode, method.rstrip(b'\0').decode(), page_size, ram_size, disc_size)
+		self.names = []		# process id -> process name
+		off = names_offset
+		for i in range(n_names):
+			n, = NAME_LEN.unpack_from(self.map, off)
+			off = off + NAME_LEN.size
+			self.names.append(self.map[off:off+n].decode('utf-8'))
+			off = off + n
+	'''
+	Yields lists of at most chunk operations, from the index start on.
+	'''
+	def chunks(self, start=0, chunk=CHUNK_OPS):
+		names = self.names
+		view = memoryview(self.map)
+		try:
+			for first in range(start, self.n_ops, chunk):
+				last = min(first+chunk, self.n_ops)
+				with view[self.ops_offset+first*RECORD.size:self.ops_offset+last*RECORD.size] as data:
+					ops = [(op.decode(), names[pid], num) for op, pid, num in RECORD.iter_unpack(data)]
+				yield ops
+		finally:
+			view.release()
+	'''
+	Yields the operations from the index start on.
+	'''
+	def ops(self, start=0):
+		for chunk in self.chunks(start):
+			for op in chunk:
+				yield op
+	def close(self):
+		if not self.map.closed:
+			self.map.close()
+		self.file.close()
+'''
+Opens a text or compiled trace, checking the first bytes of the file.
+'''
+def open_trace(path):
+	with open(path, 'rb') as f:
+		magic = f.read(len(MAGIC))
+	if magic == MAGIC:
+		return BinaryTrace(path)
+	return TextTrace(path)
+'''
+Compiles a text trace into the binary format.
+Returns the number of operations written.
+'''
+def compile_trace(src, dst):
+	ids = {}		# process name -> process id
+	n_ops = 0
+	with open(src, 'r') as f, open(dst, 'wb') as out:
+		header = read_text_header(f)
+		out.write(b'\0'*HEADER.size)	# header is written at the end
+		buf = bytearray()
+		for op, process, num in iter_text_ops(f):
+			pid = ids.get(process)
+			if pid is None:
+				pid = ids[process] = len(ids)
+			buf += RECORD.pack(op.encode(), pid, num)
+			n_ops = n_ops + 1
+			if n_ops%CHUNK_OPS == 0:	# writes a chunk of operations at a time
+				out.write(buf)
+				del buf[:]
+		out.write(buf)
+		names_offset = out.tell()
+		for process in sorted(ids, key=ids.get):
+			name = process.encode('utf-8')
+			out.write(NAME_LEN.pack(len(name)) + name)
+		out.seek(0)
+		out.write(HEADER.pack(MAGIC, VERSION, header.mode, header.switch_method.encode(),
+			header.page_size, header.ram_size, header.disc_size,
+			HEADER.size, n_ops, names_offset, len(ids)))
+	return n_ops
+'''
+Calls the Manager method of an operation.
+'''
+def run_operation(mngr, op, process, num, time):
+	if op == 'C':	### calls process creation method
+		mngr.create_process(process, num, time)
+	elif op == 'A':	### calls memory access method
+		mngr.access_memory(process, num, time)
+	elif op == 'M':	### call memory allocation method
+		mngr.allocate_memory(process, num, time)
+	elif op == 'F':	### call memory freeing method
+		mngr.free_process(process, num if num != TERMINATE else None, time)
+	else:			### reports it like everything else, see events.py
+		mngr.sink.emit(InvalidOperation(time, process, op))
+'''
+Runs every operation through the Manager, each one at the next execution time.
+Returns the execution time after the last operation.
+'''
+def replay(mngr, ops, time=0):
+	for op, process, num in ops:
+		run_operation(mngr, op, process, num, time)
+		time = time + 1
+	return time